@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+#Stand-in for the Kubernetes API server that '--backend api' talks to, serving the synthetic cluster of
+#fakeKubectl.py: every request is answered by running fakeKubectl.py, so both backends see the same pods, logs,
+#latencies and failing containers, and each request is one line of the call log.
+#   GET /api/v1/namespaces, .../pods and /apis/apps/v1/namespaces/{fed}/deployments   lists
+#   GET /api/v1/namespaces/{fed}/pods/{pod}/log                                          chunked log body, follow=true streams it
+#   GET /api/v1/namespaces/{fed}/pods/{pod}/exec                                         websocket, v4.channel.k8s.io
+#
+#   python3 benchmarks/fakeApiServer.py --cluster cluster.json --port 8001 &
+#   LOGCOLLECT_KUBECTL=benchmarks/fakeKubectl.py LOGCOLLECT_FAKE_CLUSTER=cluster.json LOGCOLLECT_FAKE_API=http://127.0.0.1:8001 \
+#       python3 kubectl-logCollect.py -n fed-amf -d all --backend api
+#
+#The cluster is the JSON file of --cluster or LOGCOLLECT_FAKE_CLUSTER, as for fakeKubectl.py, whose 'config view' points the
+#tool at this server.
+
+import os
+import sys
+import json
+import base64
+import select
+import hashlib
+import argparse
+import threading
+import subprocess
+import urllib.parse
+import http.server
+
+fakeKubectl = os.path.join(os.path.dirname(os.path.abspath(__file__)),'fakeKubectl.py')
+websocketGuid = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def getKubectlArgv(path,query):
+    #the fakeKubectl.py call answering a request, None for a path the api backend never asks for
+    parts = path.strip('/').split('/')
+    if parts==['api','v1','namespaces']:
+        return ['get','namespaces','-o','json']
+    if len(parts)==5 and parts[:3]==['api','v1','namespaces'] and parts[4]=='pods':
+        return ['get','pods','-n',parts[3],'-o','json']
+    if len(parts)==6 and parts[:4]==['apis','apps','v1','namespaces'] and parts[5]=='deployments':
+        return ['get','deployments','-n',parts[4],'-o','json']
+    if len(parts)!=7 or parts[:3]!=['api','v1','namespaces'] or parts[4]!='pods':
+        return None
+    container = query.get('container',[''])[0]
+    if parts[6]=='exec':
+        return ['exec',parts[5],'-n',parts[3],'-c',container,'--',*query.get('command',[])]
+    if parts[6]!='log':
+        return None
+    argv = ['logs',parts[5],'-n',parts[3],'-c',container]
+    if 'sinceTime' in query:
+        argv.append(f"--since-time={query['sinceTime'][0]}")
+    if 'sinceSeconds' in query:
+        argv.append(f"--since={query['sinceSeconds'][0]}s")
+    if 'tailLines' in query:
+        argv.append(f"--tail={query['tailLines'][0]}")
+    if query.get('timestamps')==['true']:
+        argv.append('--timestamps')
+    if query.get('follow')==['true']:
+        argv.append('--follow')
+    return argv
+
+def frame(data,opcode=2):
+    #a final, unmasked websocket frame as servers send them
+    length = len(data)
+    if length<126:
+        header = bytes([0x80|opcode,length])
+    elif length<65536:
+        header = bytes([0x80|opcode,126])+length.to_bytes(2,'big')
+    else:
+        header = bytes([0x80|opcode,127])+length.to_bytes(8,'big')
+    return header+data
+
+class ApiHandler(http.server.BaseHTTPRequestHandler):
+    #keep-alive like the real server, so the pooled connections of the api backend are reused
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self,format,*args):
+        pass
+
+    def sendStatus(self,code,message):
+        body = json.dumps({'kind':'Status','apiVersion':'v1','status':'Failure','message':message,'code':code}).encode()
+        self.send_response(code)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        argv = getKubectlArgv(url.path,urllib.parse.parse_qs(url.query))
+        if self.headers.get('Authorization')!='Bearer benchmark-token':
+            return self.sendStatus(401,'Unauthorized')
+        if argv==None:
+            return self.sendStatus(404,f'the benchmark cluster does not serve {url.path}')
+        proc = subprocess.Popen([sys.executable,fakeKubectl,*argv],stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        #stderr is read aside, so a chatty command can't block on it while its stdout is streamed
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+        reader.start()
+        try:
+            if argv[0]=='exec':
+                self.streamExec(proc,reader,stderr)
+            else:
+                self.streamBody(proc,reader,stderr,argv)
+        except BaseException:
+            #the client went away, a followed log would otherwise keep its command running
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            reader.join()
+            proc.wait()
+
+    def streamBody(self,proc,reader,stderr,argv):
+        #a command that fails before printing anything is an error status, like a pod or container that doesn't exist,
+        #while a followed log that stays silent is answered after a second, as the real server does
+        data = b''
+        if '--follow' not in argv or select.select([proc.stdout],[],[],1)[0]:
+            data = proc.stdout.read1(65536)
+            if not data and proc.wait()!=0:
+                reader.join()
+                return self.sendStatus(404,stderr[0].decode(errors='replace').strip() or f'command failed with exit code {proc.returncode}')
+        self.send_response(200)
+        self.send_header('Content-Type','application/json' if argv[0]=='get' else 'text/plain')
+        self.send_header('Transfer-Encoding','chunked')
+        self.end_headers()
+        while True:
+            if data:
+                self.wfile.write(f'{len(data):x}\r\n'.encode()+data+b'\r\n')
+            data = proc.stdout.read1(65536)
+            if not data:
+                break
+        self.wfile.write(b'0\r\n\r\n')
+
+    def streamExec(self,proc,reader,stderr):
+        key = self.headers.get('Sec-WebSocket-Key','')
+        self.send_response(101)
+        self.send_header('Upgrade','websocket')
+        self.send_header('Connection','Upgrade')
+        self.send_header('Sec-WebSocket-Accept',base64.b64encode(hashlib.sha1((key+websocketGuid).encode()).digest()).decode())
+        self.send_header('Sec-WebSocket-Protocol','v4.channel.k8s.io')
+        self.end_headers()
+        self.close_connection = True
+        #channel 1 is stdout, 2 stderr and 3 the status of the command once it exited
+        for data in iter(lambda: proc.stdout.read1(65536),b''):
+            self.wfile.write(frame(b'\x01'+data))
+        reader.join()
+        if stderr[0]:
+            self.wfile.write(frame(b'\x02'+stderr[0]))
+        if proc.wait()==0:
+            status = {'metadata':{},'status':'Success'}
+        else:
+            status = {'metadata':{},'status':'Failure','message':f'command terminated with non-zero exit code: {proc.returncode}',
+                'reason':'NonZeroExitCode','details':{'causes':[{'reason':'ExitCode','message':str(proc.returncode)}]}}
+        self.wfile.write(frame(b'\x03'+json.dumps(status).encode()))
+        self.wfile.write(frame(b'',opcode=8))
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the synthetic fed-amf cluster of fakeKubectl.py as a Kubernetes API server.")
+    parser.add_argument("--port",type=int,default=8001,help="port to listen on, 0 picks a free one (default: 8001)")
+    parser.add_argument("--cluster",help="cluster JSON file, defaults to LOGCOLLECT_FAKE_CLUSTER")
+    args = parser.parse_args()
+    if args.cluster:
+        os.environ['LOGCOLLECT_FAKE_CLUSTER'] = os.path.abspath(args.cluster)
+    if 'LOGCOLLECT_FAKE_CLUSTER' not in os.environ:
+        parser.error("the cluster JSON file must be given with --cluster or LOGCOLLECT_FAKE_CLUSTER")
+    server = http.server.ThreadingHTTPServer(('127.0.0.1',args.port),ApiHandler)
+    server.daemon_threads = True
+    #the address goes first to stdout, so a caller that asked for a free port knows where to connect
+    print(f'http://127.0.0.1:{server.server_address[1]}',flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == "__main__":
+    main()
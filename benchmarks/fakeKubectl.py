@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+#Stand-in for kubectl that answers the calls of kubectl-logCollect from a synthetic cluster instead of a live one.
+#The cluster is described by the JSON file in LOGCOLLECT_FAKE_CLUSTER (written by runBenchmarks.py):
+#   namespaces   names returned by 'get namespaces'
+#   deployments  {deployment:[containers]} of every namespace
+#   replicas     pods per deployment
+#   logKb        {container:KB} of 'kubectl logs' output, 'default' for the others
+#   debugCliKb   KB of every debugCli file the logCollect endpoints create
+#   latencyMs    {verb:ms} slept before answering get/logs/exec/cp
+#   followSeconds  how long 'kubectl logs -f' keeps its stream open after the log (default: until killed)
+#   stateDir     where pod /tmp directories and generated logs are kept
+#   callLog      every call is appended to it as one JSON array per line
+#The containers listed in LOGCOLLECT_FAKE_FAILING (comma separated) answer every call with an error.
+#'config view' describes the fakeApiServer.py at LOGCOLLECT_FAKE_API (default http://127.0.0.1:8001), so that
+#'--backend api' talks to it.
+
+import json
+import os
+import sys
+import time
+import random
+import shutil
+import subprocess
+
+def loadCluster():
+    with open(os.environ['LOGCOLLECT_FAKE_CLUSTER']) as clusterFile:
+        return json.load(clusterFile)
+
+def logCall(cluster,argv):
+    #JSON keeps the newlines of 'sh -c' scripts inside their line
+    with open(cluster['callLog'],'a') as callLog:
+        callLog.write(json.dumps(argv)+'\n')
+
+def getOption(args,name):
+    for i,arg in enumerate(args):
+        if arg==name and i+1<len(args):
+            return args[i+1]
+        if arg.startswith(name+'='):
+            return arg.split('=',1)[1]
+    return None
+
+def getPods(cluster):
+    return [(f'{deployment}-5d9f7c-{replica:05d}',deployment,containers)
+        for deployment,containers in cluster['deployments'].items() for replica in range(cluster['replicas'])]
+
+def podJson(namespace,name,deployment,containers):
+    return {'apiVersion':'v1','kind':'Pod','metadata':{'name':name,'namespace':namespace,'labels':{'app':deployment}},
+        'spec':{'containers':[{'name':container,'image':f'registry.local/{container}:1.0'} for container in containers]},
+        'status':{'phase':'Running','containerStatuses':[{'name':container,'ready':True,'restartCount':0} for container in containers]}}
+
+def deploymentJson(namespace,deployment,containers,replicas):
+    return {'apiVersion':'apps/v1','kind':'Deployment','metadata':{'name':deployment,'namespace':namespace},
+        'spec':{'replicas':replicas,'template':{'spec':{'containers':[
+            {'name':container,'image':f'registry.local/{container}:1.0','ports':[{'containerPort':8080+i,'protocol':'TCP'}]}
+            for i,container in enumerate(containers)]}}}}
+
+def makeLines(seed,size,start=1792310400):
+    #deterministic lines with the timestamps, levels, UE ids and cause codes of an AMF log
+    generator = random.Random(seed)
+    levels = ['INFO','INFO','INFO','DEBUG','WARN','ERROR']
+    lines = []
+    written = 0
+    n = 0
+    while written<size:
+        line = (f"{time.strftime('%Y-%m-%dT%H:%M:%S',time.gmtime(start+n))}.000Z {generator.choice(levels)} "
+            f"imsi-00101{generator.randint(0,99999):010d} procedure step {n} cause=0x{generator.randint(0,255):02x}\n")
+        lines.append(line)
+        written += len(line)
+        n += 1
+    return ''.join(lines).encode()
+
+def getLogFile(cluster,instance,container):
+    #generated once per container and reused, so the stand-in costs the same on every run
+    kb = cluster['logKb'].get(container,cluster['logKb'].get('default',64))
+    path = os.path.join(cluster['stateDir'],'logs',f'{instance}-{container}-{kb}.log')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        with open(f'{path}.{os.getpid()}','wb') as logFile:
+            logFile.write(makeLines(instance+container,kb*1024))
+        os.replace(f'{path}.{os.getpid()}',path)
+    return path
+
+def getPodTmp(cluster,instance):
+    path = os.path.join(cluster['stateDir'],'pods',instance,'tmp')
+    os.makedirs(path,exist_ok=True)
+    return path
+
+def podCurl(cluster,args):
+    #curl inside the pod: GET on a logCollect endpoint writes a debugCli file into /tmp, DELETE removes it
+    method = getOption(args,'-X') or 'GET'
+    url = [arg for arg in args if not arg.startswith('-') and arg!=method][-1]
+    podTmp = os.environ['FAKE_POD_TMP']
+    if method=='DELETE':
+        try:
+            os.remove(os.path.join(podTmp,url.rsplit('/',1)[1]))
+        except FileNotFoundError:
+            sys.stderr.write('curl: (22) The requested URL returned error: 404\n')
+            return 22
+        return 0
+    kind = url.rsplit('/',1)[1] or 'logCollect'
+    fileName = f"{os.environ['FAKE_POD']}-{os.environ['FAKE_CONTAINER']}-{kind}-{time.time_ns()}.log"
+    with open(os.path.join(podTmp,fileName),'wb') as debugFile:
+        debugFile.write(makeLines(fileName,cluster['debugCliKb']*1024))
+    sys.stdout.write(fileName)
+    return 0
+
+def getCurlShim(cluster):
+    #'sh -c' scripts call curl by name, so a curl running podCurl is put first on their PATH
+    binDir = os.path.join(cluster['stateDir'],'bin')
+    if not os.path.exists(os.path.join(binDir,'curl')):
+        os.makedirs(binDir,exist_ok=True)
+        with open(os.path.join(binDir,f'curl.{os.getpid()}'),'w') as shim:
+            shim.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" pod-curl "$@"\n')
+        os.chmod(os.path.join(binDir,f'curl.{os.getpid()}'),0o755)
+        os.replace(os.path.join(binDir,f'curl.{os.getpid()}'),os.path.join(binDir,'curl'))
+    return binDir
+
+def isFailing(container):
+    return container in os.environ.get('LOGCOLLECT_FAKE_FAILING','').split(',')
+
+def sleepFor(cluster,verb):
+    time.sleep(cluster['latencyMs'].get(verb,0)/1000)
+
+def get(cluster,namespace,args):
+    kinds = args[1]
+    if kinds in ('namespaces','namespace','ns'):
+        print(json.dumps({'apiVersion':'v1','kind':'List','items':[{'apiVersion':'v1','kind':'Namespace','metadata':{'name':name}} for name in cluster['namespaces']]}))
+        return 0
+    if namespace not in cluster['namespaces']:
+        print(json.dumps({'apiVersion':'v1','kind':'List','items':[]}))
+        return 0
+    items = []
+    if 'deployment' in kinds:
+        items += [deploymentJson(namespace,deployment,containers,cluster['replicas']) for deployment,containers in cluster['deployments'].items()]
+    if 'pod' in kinds:
+        items += [podJson(namespace,*pod) for pod in getPods(cluster)]
+    print(json.dumps({'apiVersion':'v1','kind':'List','items':items}))
+    return 0
+
+def logs(cluster,args):
+    instance,container = args[1],getOption(args,'-c')
+    with open(getLogFile(cluster,instance,container),'rb') as logFile:
+        data = logFile.read()
+    since = getOption(args,'--since-time')
+    if since!=None:
+        #lines start with their timestamp, so the first one at or after the time is found by comparing prefixes
+        lines = data.splitlines(True)
+        data = b''.join(line for line in lines if line[:19].decode()>=since[:19])
+    tail = getOption(args,'--tail')
+    if tail!=None and int(tail)>=0:
+        data = b''.join(data.splitlines(True)[-int(tail):]) if int(tail) else b''
+    if '--timestamps' in args:
+        #the node's RFC3339Nano time in front of every line, here the time the line carries itself
+        data = b''.join(line[:19]+b'.000000000Z '+line for line in data.splitlines(True))
+    sys.stdout.buffer.write(data)
+    if '-f' in args or '--follow' in args:
+        #nothing is logged while following, the stream just stays open
+        sys.stdout.flush()
+        time.sleep(cluster.get('followSeconds',365*24*3600))
+    return 0
+
+def execute(cluster,args):
+    instance,container = args[1],getOption(args,'-c')
+    command = args[args.index('--')+1:]
+    podTmp = getPodTmp(cluster,instance)
+    env = dict(os.environ,FAKE_POD=instance,FAKE_CONTAINER=container,FAKE_POD_TMP=podTmp)
+    sys.stdout.flush()
+    if command[0]=='curl':
+        os.environ.update(env)
+        return podCurl(cluster,command[1:])
+    if command[0]=='tar':
+        return subprocess.run(['tar',*command[1:-3],'-C',podTmp,command[-1]]).returncode
+    if command[0]=='sh':
+        #the pod's /tmp lives in the state directory
+        script = command[2].replace('/tmp',podTmp)
+        env['PATH'] = getCurlShim(cluster)+os.pathsep+env['PATH']
+        return subprocess.run(['/bin/sh','-c',script]+[arg.replace('/tmp/',podTmp+'/') for arg in command[3:]],env=env).returncode
+    sys.stderr.write(f'error: {command[0]}: executable file not found in $PATH\n')
+    return 126
+
+def copy(cluster,args):
+    source,destination = args[1],args[2]
+    instance,path = source.split('/',1)[1].split(':',1)
+    podFile = os.path.join(getPodTmp(cluster,instance),os.path.basename(path))
+    if not os.path.exists(podFile):
+        sys.stderr.write(f'error: {path}: No such file or directory\n')
+        return 1
+    shutil.copyfile(podFile,destination)
+    return 0
+
+def config(args):
+    #the kubeconfig 'config view --flatten --minify -o json' prints, with the token fakeApiServer.py expects
+    if args[1:2]!=['view']:
+        sys.stderr.write(f'error: the benchmark cluster does not support "config {" ".join(args[1:2])}"\n')
+        return 1
+    print(json.dumps({'apiVersion':'v1','kind':'Config','current-context':'benchmark',
+        'clusters':[{'name':'benchmark','cluster':{'server':os.environ.get('LOGCOLLECT_FAKE_API','http://127.0.0.1:8001')}}],
+        'users':[{'name':'benchmark','user':{'token':'benchmark-token'}}],
+        'contexts':[{'name':'benchmark','context':{'cluster':'benchmark','user':'benchmark'}}]}))
+    return 0
+
+def main(argv):
+    cluster = loadCluster()
+    if argv[:1]==['pod-curl']:
+        return podCurl(cluster,argv[1:])
+    logCall(cluster,argv)
+    namespace = 'default'
+    args = []
+    i = 0
+    while i<len(argv):
+        if argv[i] in ('-n','--namespace'):
+            namespace = argv[i+1]
+            i += 2
+            continue
+        #every context answers with the same cluster
+        if argv[i]=='--context':
+            i += 2
+            continue
+        if argv[i]=='--':
+            args += argv[i:]
+            break
+        args.append(argv[i])
+        i += 1
+    if not args:
+        return 1
+    verbs = {'get':lambda: get(cluster,namespace,args),'logs':lambda: logs(cluster,args),
+        'exec':lambda: execute(cluster,args),'cp':lambda: copy(cluster,args),'config':lambda: config(args)}
+    if args[0] not in verbs:
+        sys.stderr.write(f'error: the benchmark cluster does not support "{args[0]}"\n')
+        return 1
+    sleepFor(cluster,args[0])
+    if args[0] in ('logs','exec') and isFailing(getOption(args,'-c')):
+        sys.stderr.write(f'error: unable to upgrade connection: container {getOption(args,"-c")} not found\n')
+        return 1
+    return verbs[args[0]]()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
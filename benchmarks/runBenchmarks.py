@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+#Runs kubectl-logCollect against the synthetic cluster of fakeKubectl.py and reports, per scenario, the wall time,
+#the number of kubectl calls, the peak RSS of the tool and the bytes it wrote.
+#
+#   python3 benchmarks/runBenchmarks.py --replicas 4 --log-kb 1024 --latency-ms 50
+#   python3 benchmarks/runBenchmarks.py --json baseline.json
+#   python3 benchmarks/runBenchmarks.py --baseline baseline.json --extra-args "--parallel 8 --stream"
+#   python3 benchmarks/runBenchmarks.py --backend api
+#
+#With --baseline the run fails when a scenario got slower than the tolerance or needs more kubectl calls.
+
+import argparse
+import json
+import os
+import sys
+import time
+import shlex
+import shutil
+import tarfile
+import tempfile
+import statistics
+import subprocess
+
+benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+#scenario name -> arguments of kubectl-logCollect
+scenarios = {
+    'debug-all':['-n','fed-amf','-d','all'],
+    'pod-verbose':['-n','fed-amf','-p','amf-cc','-v'],
+    'onlydebug':['-n','fed-amf','-d','all','--onlydebug'],
+    'broken-container':['-n','fed-amf','-d','all'],
+}
+#scenario name -> containers that fail every call, the collection must still archive all of their siblings
+failingContainers = {
+    'broken-container':['amf-n2'],
+}
+
+def writeCluster(args,workDir):
+    cluster = {
+        'namespaces':['default','kube-system','fed-amf']+[f'fed-amf-{i}' for i in range(2,args.namespaces+1)],
+        'deployments':{'amf-cc':['amf-cc','infra'],'amf-n2':['amf-n2','infra','sctp'],'redis':['redis']},
+        'replicas':args.replicas,
+        'logKb':{'default':args.log_kb},
+        'debugCliKb':args.debugcli_kb,
+        'latencyMs':{'get':args.latency_ms,'logs':args.latency_ms,'exec':args.exec_latency_ms if args.exec_latency_ms!=None else args.latency_ms,'cp':args.latency_ms},
+        #generated logs are shared by every run, pod directories are not
+        'stateDir':os.path.join(workDir,'cluster'),
+        'callLog':os.path.join(workDir,'calls.jsonl'),
+    }
+    with open(os.path.join(workDir,'cluster.json'),'w') as clusterFile:
+        json.dump(cluster,clusterFile,indent=2)
+    return cluster
+
+def getSize(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root,name)) for root,dirs,files in os.walk(path) for name in files)
+
+def getMissingSiblings(cluster,name,outputs):
+    #the logs of every healthy container of a pod with a failing one, when the archive doesn't have them
+    failing = failingContainers.get(name,[])
+    if not failing:
+        return []
+    members = set()
+    for path in outputs:
+        if tarfile.is_tarfile(path):
+            with tarfile.open(path) as archive:
+                members.update(os.path.basename(member) for member in archive.getnames())
+    return [f'fed-amf-{deployment}-5d9f7c-{replica:05d}-{container}-debugLogs.txt'
+        for deployment,containers in cluster['deployments'].items() if set(failing)&set(containers)
+        for replica in range(cluster['replicas']) for container in containers if container not in failing
+        and f'fed-amf-{deployment}-5d9f7c-{replica:05d}-{container}-debugLogs.txt' not in members]
+
+def runScenario(args,name,workDir,cluster):
+    runDir = tempfile.mkdtemp(prefix=f'{name}-',dir=workDir)
+    callLog = os.path.join(workDir,'calls.jsonl')
+    if os.path.exists(callLog):
+        os.remove(callLog)
+    env = dict(os.environ,HOME=runDir,LOGCOLLECT_KUBECTL=os.path.join(benchmarkDir,'fakeKubectl.py'),
+        LOGCOLLECT_FAKE_CLUSTER=os.path.join(workDir,'cluster.json'),LOGCOLLECT_FAKE_FAILING=','.join(failingContainers.get(name,[])))
+    argv = [sys.executable,args.tool]+scenarios[name]+shlex.split(args.extra_args)
+    server = None
+    if args.backend=='api':
+        #a server per run, started with the failing containers of the scenario; it prints its address first
+        server = subprocess.Popen([sys.executable,os.path.join(benchmarkDir,'fakeApiServer.py'),'--port','0'],env=env,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE)
+        env['LOGCOLLECT_FAKE_API'] = server.stdout.readline().decode().strip()
+        argv += ['--backend','api']
+    start = time.monotonic()
+    with open(os.path.join(runDir,'output.txt'),'wb') as output:
+        proc = subprocess.Popen(argv,cwd=runDir,env=env,stdin=subprocess.DEVNULL,stdout=output,stderr=subprocess.STDOUT)
+        #wait4 gives the resource usage of the tool alone, not of the kubectl calls it made
+        pid,status,usage = os.wait4(proc.pid,0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.monotonic()-start
+    if server!=None:
+        server.terminate()
+        server.wait()
+    with open(os.path.join(runDir,'output.txt'),errors='replace') as output:
+        text = output.read()
+    with open(callLog) if os.path.exists(callLog) else open(os.devnull) as calls:
+        callCount = sum(1 for line in calls)
+    outputs = [os.path.join(runDir,entry) for entry in os.listdir(runDir) if entry.startswith('fed-amf-')]
+    missing = getMissingSiblings(cluster,name,outputs)
+    result = {
+        'scenario':name,
+        'ok':proc.returncode==0 and 'Archived log files successfully' in text and not missing,
+        'wallSeconds':round(wall,3),
+        'kubectlCalls':callCount,
+        'peakRssKb':usage.ru_maxrss,
+        'bytesWritten':sum(getSize(path) for path in outputs),
+    }
+    if not result['ok']:
+        result['output'] = text[-2000:]+''.join(f'\nmissing from the archive: {member}' for member in missing)
+    shutil.rmtree(runDir)
+    return result
+
+def summarize(runs):
+    #median of the timings, the worst of the memory, and the counts of the first run (they don't vary)
+    return {
+        'scenario':runs[0]['scenario'],
+        'ok':all(run['ok'] for run in runs),
+        'wallSeconds':round(statistics.median(run['wallSeconds'] for run in runs),3),
+        'kubectlCalls':runs[0]['kubectlCalls'],
+        'peakRssKb':max(run['peakRssKb'] for run in runs),
+        'bytesWritten':runs[0]['bytesWritten'],
+        'runs':len(runs),
+    }
+
+def printResults(results):
+    print(f"{'SCENARIO':<18}{'WALL(s)':>10}{'KUBECTL':>10}{'PEAK RSS(MB)':>14}{'WRITTEN(MB)':>13}")
+    for result in results:
+        color = '' if result['ok'] else '\u001b[31m'
+        print(f"{color}{result['scenario']:<18}{result['wallSeconds']:>10.3f}{result['kubectlCalls']:>10}"
+            f"{result['peakRssKb']/1024:>14.1f}{result['bytesWritten']/1024/1024:>13.2f}\u001b[0m")
+
+def compareResults(results,baselineFile,tolerance):
+    with open(baselineFile) as baseline:
+        previous = {result['scenario']:result for result in json.load(baseline)['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if before==None:
+            continue
+        if result['wallSeconds']>before['wallSeconds']*(1+tolerance/100):
+            regressions.append(f"{result['scenario']}: wall time {before['wallSeconds']}s -> {result['wallSeconds']}s")
+        if result['kubectlCalls']>before['kubectlCalls']:
+            regressions.append(f"{result['scenario']}: kubectl calls {before['kubectlCalls']} -> {result['kubectlCalls']}")
+        if result['peakRssKb']>before['peakRssKb']*(1+tolerance/100):
+            regressions.append(f"{result['scenario']}: peak RSS {before['peakRssKb']}KB -> {result['peakRssKb']}KB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kubectl-logCollect against a synthetic fed-amf cluster.")
+    parser.add_argument("--tool",default=os.path.join(os.path.dirname(benchmarkDir),'kubectl-logCollect.py'),help="kubectl-logCollect script to benchmark")
+    parser.add_argument("--scenario",action='append',choices=list(scenarios.keys()),help="scenario to run, can be repeated (default: all)")
+    parser.add_argument("--backend",choices=['kubectl','api'],default='kubectl',help="backend of the tool, api runs it against fakeApiServer.py (default: kubectl)")
+    parser.add_argument("--extra-args",default='',metavar='ARGS',help="arguments added to every scenario, like '--parallel 8 --stream'")
+    parser.add_argument("--namespaces",type=int,default=1,metavar='N',help="fed-amf namespaces the cluster lists (default: 1)")
+    parser.add_argument("--replicas",type=int,default=2,metavar='M',help="pods per deployment (default: 2)")
+    parser.add_argument("--log-kb",type=int,default=256,metavar='KB',help="size of every container's logs (default: 256)")
+    parser.add_argument("--debugcli-kb",type=int,default=64,metavar='KB',help="size of every debugCli file (default: 64)")
+    parser.add_argument("--latency-ms",type=int,default=20,metavar='MS',help="latency of every kubectl call (default: 20)")
+    parser.add_argument("--exec-latency-ms",type=int,metavar='MS',help="latency of exec calls, defaults to --latency-ms")
+    parser.add_argument("--repeat",type=int,default=3,metavar='R',help="runs per scenario, the median wall time is reported (default: 3)")
+    parser.add_argument("--json",metavar='FILE',help="write the results to a JSON file, usable as a later --baseline")
+    parser.add_argument("--baseline",metavar='FILE',help="fail when a scenario regressed against the results of an earlier --json")
+    parser.add_argument("--tolerance",type=float,default=20,metavar='PERCENT',help="allowed wall time/RSS growth against the baseline (default: 20)")
+    args = parser.parse_args()
+
+    workDir = tempfile.mkdtemp(prefix='logCollect-bench-')
+    try:
+        cluster = writeCluster(args,workDir)
+        results = []
+        for name in args.scenario or list(scenarios.keys()):
+            print(f"Running {name} {args.repeat} time(s)...",file=sys.stderr)
+            runs = [runScenario(args,name,workDir,cluster) for i in range(args.repeat)]
+            results.append(summarize(runs))
+            for run in runs:
+                if not run['ok']:
+                    print(f"\u001b[31m{name} failed:\n{run['output']}\u001b[0m",file=sys.stderr)
+                    break
+    finally:
+        shutil.rmtree(workDir)
+    printResults(results)
+    if args.json:
+        with open(args.json,'w') as jsonFile:
+            json.dump({'cluster':{key:value for key,value in cluster.items() if key not in ('stateDir','callLog')},
+                'extraArgs':args.extra_args,'results':results},jsonFile,indent=2)
+    failed = not all(result['ok'] for result in results)
+    if args.baseline:
+        regressions = compareResults(results,args.baseline,args.tolerance)
+        for regression in regressions:
+            print(f"\u001b[31mRegression: {regression}\u001b[0m")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
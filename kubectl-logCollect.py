@@ -1,466 +1,3149 @@
-#!/usr/bin/env python3
-
-import argparse
-import subprocess
-import os
-from pathlib import Path
-import tarfile
-import sys
-import calendar
-import time
-import shutil
-from multiprocessing import Lock
-import signal
-
-#pod:isCommon
-debugCliData = {'amf-cc':False,'amf-n2':False}
-exitMessage = "Thanks for using AMF's log collection tool."
-tarDir = ''
-
-class LogParser(argparse.ArgumentParser):
-    def error(self, message):
-        self.print_help()
-        #handling errors when invalid arguments are passed.
-        if message.startswith('unrecognized arguments'):
-            print(f"\n\u001b[31mError: {message}\nPlease enter the arguments from the given choices.\u001b[0m")
-        else:
-            print(f"\u001b[31{message}\u001b[0m")
-        print(exitMessage)
-        sys.exit(2)
-
-def signalHandler(signum,frame):
-    global tarDir
-    tarDir = f'/tmp/fed-amf'
-    shutil.rmtree(tarDir)
-    print("\nUser interrupt captured. \nCleaning up and exiting...")
-    exit()
-
-signal.signal(signal.SIGINT,signalHandler)
-signal.signal(signal.SIGTSTP,signalHandler)
-
-def getTimestamp():
-    # gmt stores current gmtime
-    gmt = time.gmtime()
-    # ts stores timestamp
-    ts = calendar.timegm(gmt)
-    return ts
-
-def archiveItems(fed,parser):
-    global tarDir
-    ts = getTimestamp()
-    archiveName = f'{fed}-Logs_{ts}.tar.gz'
-    # storing as .tar.gz file, gz is the compression algorithm
-    with tarfile.open(archiveName, 'w:gz') as tf:
-        try:
-            tf.add(tarDir,arcname=os.path.basename(tarDir))
-        except:
-            print("\u001b[31mError: Unable to archive files at the moment. Cleaning up and exiting...\u001b[0m")
-            shutil.rmtree(tarDir)
-            exit()
-        print("\u001b[32mArchived log files successfully.\u001b[0m")
-    print("Cleaning up...")
-    #deletes unempty directories
-    shutil.rmtree(tarDir)
-
-def storeDeploymentList(fed):
-    global tarDir
-    p=subprocess.run(f"/usr/bin/kubectl get deployment -n {fed}| awk '{{print $1}}'",shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    if p.stderr.decode()!='':
-        print(f"\u001b[31m{p.stderr.decode()}")
-        print(f"Couldn't retrieve list of pods at the moment. Cleaning up and exiting...\u001b[0m")
-        if os.path.exists(tarDir):
-            shutil.rmtree(tarDir)
-        exit()
-    deploymentList = p.stdout.decode().split('\n')
-    #deleting header
-    del deploymentList[0] , deploymentList[len(deploymentList)-1] 
-    return deploymentList 
-
-def getPort(fed,pod):
-    global tarDir
-    p=subprocess.run(f"/usr/bin/kubectl get deployment -n {fed} {pod} -o yaml | grep containerPort",shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    if p.stderr.decode()!='':
-        print(f"\u001b[31m{p.stderr.decode()}")
-        print(f"Couldn't retrieve container port for {pod} at the moment. Cleaning up and exiting...\u001b[0m")
-        if os.path.exists(tarDir):
-            shutil.rmtree(tarDir)
-        exit()
-    containerPort = p.stdout.decode()
-    for i in containerPort.split():
-        if i.isdigit():
-            port = i
-            break
-    return port
-
-def storeLogs(fileName,fed,instance,pod):
-    global tarDir
-    #create directory
-    if os.path.exists(tarDir):
-        pass
-    else:
-        os.makedirs(tarDir)
-    #write to file
-    with open(f'{tarDir}/{fileName}', 'w') as logfile:
-        try:
-            subprocess.run(f'/usr/bin/kubectl cp {fed}/{instance}:/tmp/{fileName} /tmp/{fed}/{fileName} -c {pod}',stdout=subprocess.PIPE,shell=True,check=True)
-        except subprocess.CalledProcessError as err:
-            print(f"\u001b[31m{err}")
-            print(f"Couldn't retrieve logs at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-    try:
-        port = getPort(fed,pod)
-        subprocess.run(f'/usr/bin/kubectl exec -n {fed} {instance} -c {pod} -ti -- curl -X DELETE http://127.0.0.1:{port}/debug/v1/delete/{fileName}',stdout=subprocess.PIPE,shell=True,check=True)
-    except subprocess.CalledProcessError as err:
-        print(f"\u001b[31m{err}")
-        print(f"Couldn't delete logs from {instance} at the moment. Cleaning up and exiting...\u001b[0m")
-        if os.path.exists(tarDir):
-            shutil.rmtree(tarDir)
-        exit()
-
-def storeDebugLogs(fed,instance,pod,workerNode):
-    global tarDir
-    #create directory
-    if os.path.exists(tarDir):
-        pass
-    else:
-        os.makedirs(tarDir)
-    ts = getTimestamp()
-    with open(f'{tarDir}/{fed}-{instance}-{workerNode}-debugLogs.txt', 'w') as logfile:
-        try:
-            subprocess.run(f'/usr/bin/kubectl logs {instance} -n {fed} -c {workerNode}',stdout=logfile,shell=True,check=True)
-        except subprocess.CalledProcessError as err:
-            print(f"\u001b[31m{err}")
-            print(f"Couldn't retrieve logs at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-
-def storeDeployment(fed,pod):
-    global tarDir
-    #create directory
-    if os.path.exists(tarDir):
-        pass
-    else:
-        os.makedirs(tarDir)
-    ts = getTimestamp()
-    with open(f'{tarDir}/{fed}-{pod}-deployment.yaml', 'w') as logfile:
-        try:
-            subprocess.run(f'/usr/bin/kubectl get deployment -n {fed} {pod} -o yaml',stdout=logfile,shell=True,check=True)
-        except subprocess.CalledProcessError as err:
-            print(f"\u001b[31m{err}")
-            print(f"Couldn't retrieve deployment file at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-
-#fetching file name
-def getFileName(fed,instance,parser,pod,isCommon=False,isVerbose=False):
-    global tarDir
-    port = getPort(fed,pod)
-
-    if(isCommon):
-        p=subprocess.run(f'/usr/bin/kubectl exec -n {fed} {instance} -c {pod} -ti -- curl -X GET http://127.0.0.1:{port}/debug/v1/logCollect/common',stdout=subprocess.PIPE,shell=True,check=True,stderr=subprocess.PIPE)
-        
-        if p.stderr.decode()!='':
-            print(f"\u001b[31m{p.stderr.decode()}")
-            print(f"Couldn't retrieve common logs at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-        else: 
-            fileName = p.stdout.decode()
-            storeLogs(fileName,fed,instance,pod)
-    elif(isVerbose):
-        p=subprocess.run(f'/usr/bin/kubectl exec -n {fed} {instance} -c {pod} -ti -- curl -X GET http://127.0.0.1:{port}/debug/v1/logCollect/verbose',stdout=subprocess.PIPE,shell=True,check=True,stderr=subprocess.PIPE)
-        
-        if p.stderr.decode()!='':
-            print(f"\u001b[31m{p.stderr.decode()}")
-            print(f"Couldn't retrieve common logs at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-        else: 
-            fileName = p.stdout.decode()
-            storeLogs(fileName,fed,instance,pod)
-    else:
-        p=subprocess.run(f'/usr/bin/kubectl exec -n {fed} {instance} -c {pod} -ti -- curl -X GET http://127.0.0.1:{port}/debug/v1/logCollect',stdout=subprocess.PIPE,shell=True,check=True,stderr=subprocess.PIPE)
-            
-        if p.stderr.decode()!='':
-            print(f"\u001b[31m{p.stderr.decode()}")
-            print(f"Couldn't retrieve logs at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-        else:
-            fileName = p.stdout.decode()
-            storeLogs(fileName,fed,instance,pod)
-
-def getWorkerNodes(fed,pod):
-    global tarDir
-    p=subprocess.run(f"/usr/bin/kubectl get po -o custom-columns=CONTAINER:.spec.containers[*].name -n {fed} | grep {pod}",shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    if p.stderr.decode()!='':
-        print(f"\u001b[31m{p.stderr.decode()}")
-        print(f"Couldn't retrieve list of containers for {pod} at the moment. Cleaning up and exiting...\u001b[0m")
-        if os.path.exists(tarDir):
-            shutil.rmtree(tarDir)
-        exit()
-    workerNodeList = p.stdout.decode().split('\n')
-    if len(workerNodeList)>1:
-        del workerNodeList[1:]
-    tempString = ' '.join([str(item) for item in workerNodeList])
-    workerNodes = tempString.split(',')
-    return workerNodes
-
-def storeInstance(fed):
-    global tarDir
-    #create directory
-    if os.path.exists(tarDir):
-        pass
-    else:
-        os.makedirs(tarDir)
-    #store information of pods to file
-    with open(f'{tarDir}/fed-amf-podsInformation.txt', 'w') as filePtr:
-        try:
-            subprocess.run(f"/usr/bin/kubectl get po -o custom-columns=POD:.metadata.name,CONTAINER:.spec.containers[*].name,IMAGE:.spec.containers[*].image -n {fed}",stdout=filePtr,shell=True,check=True)
-        except subprocess.CalledProcessError as err:
-            print(f"\u001b[31m{err}")
-            print(f"Couldn't retrieve pods information at the moment. Cleaning up and exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-    
-    p=subprocess.run(f"/usr/bin/kubectl get po -o custom-columns=POD:.metadata.name -n {fed}",shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    if p.stderr.decode()!='':
-        print(f"\u001b[31m{p.stderr.decode()}")
-        print(f"Couldn't retrieve list of pods at the moment. Cleaning up and exiting...\u001b[0m")
-        if os.path.exists(tarDir):
-            shutil.rmtree(tarDir)
-        exit()
-    podList = p.stdout.decode().split('\n')
-    #deleting header
-    del podList[0]   
-    return podList
-
-#stores instances, iterates through them while calling upon the getFileName() to store the logs and finally calls archiveItems() to tar the files.
-def storeLogCaller(podList,fed,parser,pod=None,isVerbose=False):
-    global debugCliData
-    #iterating through instances
-    for instance in podList:
-        #if pod value was not entered
-        if pod==None:
-            #if it is an instance that starts with the given dictionary of prefixes(pods)
-            for key in debugCliData.keys():
-                if instance.startswith(key):
-                    #checking if common configs have already been stored for each pod or not
-                    if debugCliData[key]==False:
-                        debugCliData[key]=True
-                        getFileName(fed,instance,parser,key,True)
-                    getFileName(fed,instance,parser,key,False,isVerbose)                        
-        else:
-            if instance.startswith(pod):
-                if debugCliData[pod]==False:
-                        debugCliData[pod]=True
-                        getFileName(fed,instance,parser,pod,True)
-                getFileName(fed,instance,parser,pod,False,isVerbose)
-    
-    archiveItems(fed,parser)
-
-def storeDebugLogsCaller(podList,workerNodes,fed,pod,worker=None):
-    for instance in podList:
-        #if pod value was not entered
-        if worker==None:
-            for workerNode in workerNodes:
-                if instance.startswith(pod):
-                    storeDebugLogs(fed,instance,pod,workerNode)                      
-        else:
-            if instance.startswith(pod):
-                storeDebugLogs(fed,instance,pod,worker)
-    
-def readArguments(args,parser):
-    #storing fed names
-    fedList =[]
-    p=subprocess.run("/usr/bin/kubectl get namespaces | awk '{print $1}'",shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    if p.stderr.decode()!='':
-        print(f"\u001b[31m{p.stderr.decode()}")
-        print(f"Couldn't retrieve feds at the moment.\u001b[0m")
-        exit()
-    fedList = p.stdout.decode().split('\n')
-    del fedList[0], fedList[len(fedList)-1]
-
-    # perform some action only if -n value specified correctly
-    if args.namespace in fedList:
-        print(f"Fed '{args.namespace}' exists in the cluster. Entering execution...")
-        #handling feds apart from fed-amf
-        if args.namespace != 'fed-amf':
-            print(f"\n\u001b[31mError: This tool doesn't provide support for {args.namespace} at the moment.\u001b[0m")
-            exit()
-
-        global tarDir
-        tarDir = f'/tmp/{args.namespace}'
-        podList = storeInstance(args.namespace)
-        deploymentList = storeDeploymentList(args.namespace)
-        
-        if args.onlydebug and not(args.debuglogs):
-            print(f"\u001b[31mError: Please specify the pod from {deploymentList} as argument to '-d' if you wish to store debug logs. Cleaning up and Exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-        #if -d argument has been entered   
-        elif args.debuglogs in deploymentList:   
-            workerNodes = getWorkerNodes(args.namespace,args.debuglogs)
-            if '' in workerNodes:
-                print(f"No workerNodes available for {args.debuglogs}, skipping debug logs...") 
-            elif args.container:
-                if args.container in workerNodes:
-                    print(f"Storing debug logs for {args.container} node of {args.debuglogs}...")
-                    storeDebugLogsCaller(podList,workerNodes,args.namespace,args.debuglogs,args.container) 
-                else:
-                    print(f"\u001b[31m Containers present in {args.debuglogs}: {workerNodes}.\nError:{args.container} doesn't exist in {args.debuglogs}. Cleaning up and Exiting...\u001b[0m")
-                    if os.path.exists(tarDir):
-                        shutil.rmtree(tarDir)
-                    exit()
-            else:
-                print(f"No container was specified for {args.debuglogs}. Storing debug logs for all containers of {args.debuglogs}...")
-                storeDebugLogsCaller(podList,workerNodes,args.namespace,args.debuglogs)
-
-            print(f"Storing deployment files for {args.debuglogs}...")
-            storeDeployment(args.namespace,args.debuglogs)
-
-        elif args.debuglogs == 'all': 
-            print(f"Storing debug logs and deployment files for {deploymentList} in {args.namespace}...")
-            for key in deploymentList:
-                workerNodes = getWorkerNodes(args.namespace,key)
-                if '' in workerNodes:
-                    print(f"No workerNodes available for {key}, skipping debug logs...")
-                else:
-                    storeDebugLogsCaller(podList,workerNodes,args.namespace,key)
-                storeDeployment(args.namespace,key)
-        elif args.debuglogs!=None:
-            print(f"\u001b[31mError:{args.debuglogs} is not supported at the moment. Please specify a pod from {deploymentList} as argument to '-d'. Cleaning up and Exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-        elif args.debuglogs==None and args.container!=None:
-            print(f"\u001b[31mError: Please specify the pod from {deploymentList} as argument to '-d'. Cleaning up and Exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-            exit()
-        else:
-            pass
-        if args.onlydebug:
-            archiveItems(args.namespace,parser)
-        
-        if not(args.onlydebug):
-            #storing data for particular pod only
-            if args.pod:
-                if args.pod in debugCliData:
-                    print(f"Storing logs for {args.pod}...")
-                    storeLogCaller(podList,args.namespace, parser,args.pod,True) if args.verbose else storeLogCaller(podList,args.namespace, parser,args.pod)
-                else:
-                    print(f"If you wish to debug a specific pod in a fed, please specify the pod from {list(debugCliData.keys())} as argument to '-p'.\n\u001b[31mError: The pod '{args.pod}' doesn't exist in this cluster. Please enter the name of the pod from the above choices. Cleaning up and Exiting...\u001b[0m")
-                    if os.path.exists(tarDir):
-                        shutil.rmtree(tarDir)
-            #storing data for all pods
-            else:
-                print(f"No pod argument was entered. Storing logs for pods {list(debugCliData.keys())} in {args.namespace}...")
-                storeLogCaller(podList,args.namespace,parser,isVerbose=True) if args.verbose else storeLogCaller(podList,args.namespace,parser) 
-    else:
-        if args.namespace!=None:
-            print(f"The name of the federation that you wish to debug must be provided from {fedList} as argument to '-n' in order to run the script.")
-            print(f"\u001b[31mError: The fed '{args.namespace}' doesn't exist in this cluster. Please enter the name of the federation from the above choices. Cleaning up and Exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-        else:
-            print(f"The name of the federation that you wish to debug must be provided from {fedList} as argument to '-n' in order to run the script.")
-            print("\u001b[31mError: No federation argument was entered. Please enter the name of the federation from the above choices. Cleaning up and Exiting...\u001b[0m")
-            if os.path.exists(tarDir):
-                shutil.rmtree(tarDir)
-    print(exitMessage)
-
-def checkExecution():
-    if os.access(os.path.expanduser("~/.lockfile.vestibular.lock"), os.F_OK):
-        #if the lockfile is already there then check the PID number
-        #in the lock file
-        pidfile = open(os.path.expanduser("~/.lockfile.vestibular.lock"), "r")
-        pidfile.seek(0)
-        old_pid = pidfile.readline()
-        # Now we check the PID from lock file matches to the current
-        # process PID
-        if os.path.exists("/proc/%s" % old_pid):
-                print("\u001b[31mYou already have an instance of the program running.\u001b[0m")
-                sys.exit(1)
-        else:
-                #File is there but the program is not running
-                #Removing lock file for old pid as it can be there because of the program last time it was run...
-                os.remove(os.path.expanduser("~/.lockfile.vestibular.lock"))
-
-    pidfile = open(os.path.expanduser("~/.lockfile.vestibular.lock"), "w")
-    pidfile.write("%s" % os.getpid())
-    pidfile.close()
-
-def main():
-    #defining parser
-    parser = LogParser(formatter_class=argparse.RawDescriptionHelpFormatter,
-    description='''\
-Automated retrieval and storage of log data to improve debuggability.
-
-This tool helps collect logs from multiple pods/containers across different federations.
-At the moment, this tool only provides support for debugCli logs for amf-cc and amf-n2 from the federation fed-amf.
-
-The name of the federation that you wish to debug must be provided as argument to '-n' in order to run the script.
-Additionally, if you wish to debug a specific pod in a fed, please specify the pod as argument to '-p'.
-
-This tool also supports collecting debug logs from all pods in the fed, including deployment files. Use the argument '-d' to specify the pod and '-c' if you wish to collect
-from a specific container in the pod.
-
-Examples:
-    #Collect and store logs of all pods in fed-amf:
-    kubectl logCollect -n fed-amf
-    
-    #Collect and store logs of a specific pod (amf-cc here) in fed-amf:
-    kubectl logCollect -n fed-amf -p amf-cc
-
-    #Additionally, collect and store rest api logs + debug logs of a pod in fed-amf:
-    kubectl logCollect -n fed-amf -d amf-cc
-                        (or)
-    kubectl logCollect -n fed-amf -p amf-cc -d amf-cc
-    
-    #Collect and store debugCli logs + debug logs of a specific container in a pod:
-    kubectl logCollect -n fed-amf -d amf-n2 -c infra
-                        (or)
-    kubectl logCollect -n fed-amf -p amf-cc -d amf-n2 -c infra                
-
-    #Collect and store debugCli logs + debug logs of all pods in fed-amf:
-    kubectl logCollect -n fed-amf -d all
-                        (or)
-    kubectl logCollect -n fed-amf -p amf-cc -d all
-
-    #To store only debug logs w/o debugCli logs, add the --onlydebug flag:
-    kubectl logCollect -n fed-amf -d all --onlydebug
-                        (or)
-    kubectl logCollect -n fed-amf -d amf-cc --onlydebug
-    
-    #Display help message:
-    kubectl logCollect -h
-        ''')
-    # specifying the command line arguments that the program is willing to accept
-    parser.add_argument(
-        "-n", "--namespace", help="name of the federation")
-    parser.add_argument("-p", "--pod", help="name of the pod")
-    parser.add_argument("-d", "--debuglogs",help="option to print debug logs for a pod")
-    parser.add_argument("-c", "--container",help="name of the container you wish to print debug logs for")
-    parser.add_argument("-v","--verbose", action='store_true', help="increase output verbosity")
-    parser.add_argument("--onlydebug",action='store_true', help="store only debug logs w/o debugCli logs")
-    # parse_args() method returns actual argument data from the command line
-    args = parser.parse_args()
-    
-    print("Reading arguments...")
-    readArguments(args,parser)
-
-
-if __name__ == "__main__":
-    checkExecution()
-    main()
-    os.remove(os.path.expanduser("~/.lockfile.vestibular.lock"))
\ No newline at end of file
+#!/usr/bin/env python3
+
+import argparse
+import os
+import json
+import re
+import io
+import gzip
+from collections import deque,namedtuple,Counter
+import sys
+from datetime import datetime,timezone
+import time
+from threading import Lock
+import threading
+import signal
+import functools
+import zlib
+import bisect
+import fcntl
+import importlib.util
+
+#modules that are only loaded once a run gets past its argument checks, see loadLazyModules()
+lazyModules = []
+
+def lazyImport(name):
+    #the module is loaded on first use, so '-h', argument errors and --dry-run don't pay for the archive, asyncio and TLS
+    #machinery they never touch; like an import statement a dotted name gives its top-level package
+    if name not in sys.modules:
+        spec = importlib.util.find_spec(name)
+        #logPipeline.py has to be installed next to the script
+        if spec==None:
+            raise ModuleNotFoundError(f"No module named '{name}'",name=name)
+        spec.loader = importlib.util.LazyLoader(spec.loader)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        parent,dot,child = name.rpartition('.')
+        if parent:
+            setattr(sys.modules[parent],child,module)
+        lazyModules.append(module)
+    return sys.modules[name.partition('.')[0]]
+
+def loadLazyModules():
+    #a lazy module isn't safe to load from two threads at once, so they are all loaded before any worker starts
+    for module in lazyModules:
+        getattr(module,'__doc__')
+
+subprocess = lazyImport('subprocess')
+tarfile = lazyImport('tarfile')
+tempfile = lazyImport('tempfile')
+calendar = lazyImport('calendar')
+shutil = lazyImport('shutil')
+concurrent = lazyImport('concurrent.futures')
+socket = lazyImport('socket')
+ssl = lazyImport('ssl')
+base64 = lazyImport('base64')
+queue = lazyImport('queue')
+http = lazyImport('http.client')
+urllib = lazyImport('urllib.parse')
+shlex = lazyImport('shlex')
+asyncio = lazyImport('asyncio')
+lzma = lazyImport('lzma')
+hashlib = lazyImport('hashlib')
+random = lazyImport('random')
+logPipeline = lazyImport('logPipeline')
+
+#prefix of the debugCli pods -> base path of their logCollect/delete endpoints, the "debugCli" table of the --config file
+debugCliEndpoints = {'amf-cc':'/debug/v1','amf-n2':'/debug/v1'}
+#feds the tool collects from, the "feds" list of the --config file
+supportedFeds = ['fed-amf']
+#{'context','namespace','parallel','maxProcs'} targets of the --config file collected by --all-targets
+configTargets = []
+#pod:isCommon
+debugCliData = {pod:False for pod in debugCliEndpoints}
+#guards the check-and-set on debugCliData when instances are collected in parallel
+debugCliLock = Lock()
+exitMessage = "Thanks for using AMF's log collection tool."
+tarDir = ''
+#number of instances/containers collected at once, set through --parallel
+parallelism = 1
+#fed -> {'pods':[...],'deployments':{name:deployment}}, filled once per run by loadClusterSnapshot()
+clusterSnapshot = {}
+#(fed,pod) -> container port, shared by every collection path of the run
+portCache = {}
+portCacheLock = Lock()
+#seconds a port stays valid in the on-disk cache, 0 keeps the cache in memory only (set through --port-cache-ttl)
+portCacheTtl = 0
+#seconds the namespaces, pods and deployments listed by a run are trusted by later runs to accept -n/-d and to plan
+#a --dry-run without asking the cluster, 0 always asks it (set through --topology-ttl)
+topologyTtl = 60
+#with --dry-run nothing is collected, the files and tasks of the run are listed with their (estimated) size instead
+dryRun = False
+dryRunPlan = []
+#bytes the tasks of this run wrote by deployment/container or debugCli prefix, and the averages saved by earlier runs
+taskSizes = {}
+taskSizesLock = threading.Lock()
+sizeHistory = {}
+#directory for state kept between runs
+stateDir = os.path.expanduser('~/.logCollect')
+#archive written while collecting when --stream is given, members then never touch tarDir
+streamArchive = None
+#bytes of a member kept in memory before it is spooled to a temporary file, derived from --memory-limit
+spoolSize = 64*1024*1024
+#MB the buffers of a run may hold in memory, shared by the members being collected at the same time
+memoryLimit = 256
+#with --max-file-size only the last bytes of a bigger log file are stored, 0 stores everything
+maxFileBytes = 0
+#compression of the output archive, set through --compression, --level and --compress-threads
+compression = 'gz'
+compressionLevel = None
+compressThreads = 1
+#file extension and default level for every supported compression
+compressionFormats = {'gz':('.tar.gz',9),'zst':('.tar.zst',3),'xz':('.tar.xz',6),'none':('.tar',None)}
+#window passed to 'kubectl logs', set through --since/--since-time
+logsSince = None
+logsSinceTime = None
+#with --incremental, debug logs start where the checkpoint of the previous run left off
+incremental = False
+#checkpoint of the previous run: {'archive':name,'containers':{'instance/container':time}}
+checkpoint = {}
+#node time of the last line collected from each container in this run, saved as the next checkpoint
+collectedAt = {}
+checkpointLock = Lock()
+#--follow cuts its output into segments by time and size, and looks for new pods at this interval
+segmentSeconds = 300
+segmentBytes = 100*1024*1024
+followRediscoverSeconds = 30
+#kubectl binary every command runs, LOGCOLLECT_KUBECTL points the tool at another one
+kubectlPath = os.environ.get('LOGCOLLECT_KUBECTL','/usr/bin/kubectl')
+#kubeconfig context of every kubectl call, set through --context, None uses the current context
+kubeContext = None
+#lock file held while collecting from a context and fed, so runs against other targets aren't held back
+targetLock = None
+#when a run is one target of a fan-out, the consolidated archive its checkpoint refers to
+fanoutArchive = None
+#directory of the per-target archives of a fan-out, removed when the run is interrupted
+fanoutDir = None
+#seconds a kubectl call may run (or stay silent while transferring logs), set through --timeout
+commandTimeout = 300
+#kubectl processes allowed to run at the same time, set through --max-procs
+maxProcesses = 16
+commandRunner = None
+commandRunnerLock = Lock()
+#with --batched every debugCli file of an instance is requested, streamed back and deleted in one exec session
+batchedDebugCli = False
+#runs inside the pod with the port, the endpoints' base path and the logCollect endpoints as arguments, writing '<size> <name>' and the file for each
+batchedScript = '''set -e
+port=$1
+base=$2
+shift 2
+for endpoint in "$@"; do
+    fileName=$(curl -sS -X GET "http://127.0.0.1:$port$base/logCollect$endpoint")
+    filterFile "/tmp/$fileName"
+    printf '%s %s\\n' "$(wc -c < "/tmp/$fileName")" "$fileName"
+    cat "/tmp/$fileName"
+    curl -sS -X DELETE "http://127.0.0.1:$port$base/delete/$fileName" > /dev/null
+done'''
+#how the tool talks to the cluster, set through --backend
+backendName = 'kubectl'
+clusterBackend = None
+backendLock = Lock()
+#with --index a {archive}.idx file records time ranges, level counts and UE ids/error codes of the text members
+indexArchive = False
+#text members are indexed in chunks of this size, the unit 'query' decompresses
+indexChunkSize = 64*1024
+#a query skips forward by decompressing up to this many bytes before it restarts from a closer gzip block
+indexSeekDistance = 4*1024*1024
+timestampPattern = re.compile(rb'\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d')
+#the RFC3339Nano timestamp 'kubectl logs --timestamps' puts in front of every line
+stampPrefix = re.compile(rb'^[^ \n]+ ',re.M)
+levelPattern = re.compile(rb'\b(TRACE|DEBUG|INFO|NOTICE|WARN|WARNING|ERROR|CRITICAL|FATAL)\b')
+#UE identities and error codes, the tokens a query can find without scanning
+tokenPattern = re.compile(rb'\b(?:imsi-\d{5,15}|imei-\d{14,16}|supi-[\w-]+|suci-[\w-]+|5g-guti-\w+|tmsi-\w+|(?:ran|amf)-ue-ngap-id[=:]\d+|(?:cause|error|errorcode|errcode)[=:]\w+)',re.I)
+#with --dedup deployment YAMLs, the pods table and common debugCli logs already in the store of earlier runs are only
+#referenced from the archive's dedup.json: {fileName:{'sha256':digest,'size':bytes}}
+dedupArtifacts = False
+dedupRefs = {}
+dedupLock = threading.Lock()
+#LineFilter of --grep/--log-level/--window, None when no filter is given
+logFilter = None
+#start of the --window, handed to 'kubectl logs' as --since-time
+windowStart = None
+#--log-level keeps lines of the given level and the ones above it
+logLevelRanks = {'TRACE':0,'DEBUG':1,'INFO':2,'NOTICE':3,'WARN':4,'WARNING':4,'ERROR':5,'CRITICAL':6,'FATAL':7}
+#spans of the run, one per collection phase and external call, for runReport.json, --report-top and --trace-file
+runSpans = []
+runSpansLock = threading.Lock()
+runStart = time.monotonic()
+runStartedAt = datetime.now(timezone.utc)
+reportTop = 5
+traceFile = None
+#marks threads running a task so failures are returned instead of exiting, and holds what the task wrote
+#so that a failed attempt can be undone
+workerState = threading.local()
+#a failed task is tried again up to --retries times, waiting --retry-backoff seconds doubled on every attempt
+retries = 2
+retryBackoff = 1.0
+#a pod with this many failed tasks in the run has its remaining tasks skipped, 0 never skips (--breaker-threshold)
+breakerThreshold = 3
+podFailures = Counter()
+#with --fail-fast the first failed task discards the collection, otherwise the rest is archived with a failed.json
+failFast = False
+#{'kind','instance',...,'error'} of the tasks that failed for good, and the ones to collect again with --rerun
+failedTasks = []
+failedTasksLock = threading.Lock()
+rerunTasks = None
+#with --budget no task starts after this time.monotonic() value, the rest of the budget is left to archiving
+deadline = None
+budgetSkipped = "Skipped, the --budget ran out."
+budgetCut = "Cut off, the --budget ran out while it was collected."
+#'instance/container' -> 'last N lines' or 'full' for the triage.json of a --budget run
+triageDepth = {}
+
+class CollectionError(Exception):
+    pass
+
+CommandResult = namedtuple('CommandResult',['argv','rc','stdout','stderr','duration','timedOut'])
+
+class CommandStream:
+    #file-like view of a running command's stdout, read from a collector thread while the runner's loop does the I/O
+    def __init__(self,runner,argv,timeout):
+        self.runner = runner
+        self.argv = argv
+        self.timeout = timeout
+        self.start = time.monotonic()
+        self.timedOut = False
+        self.bytesRead = 0
+        self.proc = runner.call(runner.spawn(argv))
+
+    def read(self,size=-1):
+        try:
+            data = self.runner.call(asyncio.wait_for(self.proc.stdout.read(size if size!=None else -1),self.timeout))
+            self.bytesRead += len(data)
+            return data
+        except asyncio.TimeoutError:
+            self.timedOut = True
+            self.runner.call(self.runner.kill(self.proc))
+            raise subprocess.TimeoutExpired(self.argv,self.timeout)
+
+    def close(self,kill=False):
+        #the rest of the output (like the end blocks of a tar stream) is drained so the command can exit on its own,
+        #while a reader that gave up kills it instead
+        try:
+            while not kill and not self.timedOut and self.read(65536):
+                pass
+        except subprocess.TimeoutExpired:
+            pass
+        #a command that reached the end of its output is only waited for, signalling it could reap it behind asyncio's back
+        if kill:
+            self.runner.call(self.runner.kill(self.proc))
+        rc,stderr = self.runner.call(self.runner.finish(self.proc))
+        self.runner.slots.release()
+        return recordCall(CommandResult(self.argv,rc,b'',stderr,time.monotonic()-self.start,self.timedOut),self.bytesRead)
+
+    def interrupt(self):
+        #ends a read blocked on a silent command in another thread, which then sees the end of the output
+        self.runner.call(self.runner.kill(self.proc))
+
+class CommandRunner:
+    #every external command runs on one asyncio loop in a background thread: collectors on any thread share
+    #its process limit, no shell is involved, and a hung call is killed at its timeout instead of stalling the run
+    def __init__(self,maxProcesses):
+        self.loop = asyncio.new_event_loop()
+        self.slots = threading.BoundedSemaphore(maxProcesses)
+        self.processes = set()
+        threading.Thread(target=self.loop.run_forever,daemon=True).start()
+
+    def call(self,coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine,self.loop).result()
+
+    async def spawn(self,argv):
+        proc = await asyncio.create_subprocess_exec(*argv,stdin=asyncio.subprocess.DEVNULL,stdout=asyncio.subprocess.PIPE,stderr=asyncio.subprocess.PIPE)
+        #stderr is drained alongside stdout so a chatty command can't block on a full pipe
+        proc.stderrTask = asyncio.ensure_future(self.readTail(proc.stderr))
+        self.processes.add(proc)
+        return proc
+
+    async def readTail(self,stream,limit=64*1024):
+        tail = b''
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                return tail
+            tail = (tail+chunk)[-limit:]
+
+    async def kill(self,proc):
+        if proc.returncode==None:
+            proc.kill()
+
+    async def finish(self,proc):
+        #output a killed command left unread is discarded, asyncio only reports the exit once the pipe is at its end
+        while await proc.stdout.read(65536):
+            pass
+        rc = await proc.wait()
+        stderr = await proc.stderrTask
+        self.processes.discard(proc)
+        return rc,stderr
+
+    async def execute(self,argv,timeout,stdout):
+        start = time.monotonic()
+        proc = await self.spawn(argv)
+        chunks = []
+        timedOut = False
+        try:
+            while True:
+                #a short call is bounded as a whole, a transfer into stdout only while it stays silent
+                wait = timeout if timeout==None or stdout!=None else max(0,start+timeout-time.monotonic())
+                chunk = await asyncio.wait_for(proc.stdout.read(65536),wait)
+                if not chunk:
+                    break
+                if stdout!=None:
+                    stdout.write(chunk)
+                else:
+                    chunks.append(chunk)
+        except asyncio.TimeoutError:
+            timedOut = True
+            await self.kill(proc)
+        rc,stderr = await self.finish(proc)
+        return CommandResult(argv,rc,b''.join(chunks),stderr,time.monotonic()-start,timedOut)
+
+    def run(self,argv,timeout=None,stdout=None):
+        with self.slots:
+            result = self.call(self.execute(argv,timeout,stdout))
+        return recordCall(result,len(result.stdout))
+
+    def open(self,argv,timeout=None):
+        #the slot is held until the stream is closed
+        self.slots.acquire()
+        try:
+            return CommandStream(self,argv,timeout)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def killAll(self):
+        for proc in list(self.processes):
+            self.loop.call_soon_threadsafe(proc.kill)
+
+def recordSpan(kind,name,start,duration,bytes=None,rc=None,detail=None):
+    span = {'kind':kind,'name':name,'start':round(start-runStart,6),'duration':round(duration,6),'bytes':bytes,'rc':rc,
+        'detail':detail,'thread':threading.current_thread().name,'threadId':threading.get_ident()}
+    with runSpansLock:
+        runSpans.append(span)
+
+def recordCall(result,bytes):
+    #kubectl calls are named by their verb, API requests by their method or exec
+    verb = result.argv[3] if result.argv[1:2]==['--context'] else result.argv[1]
+    name = f'kubectl {verb}' if result.argv[0]==kubectlPath else f'api {result.argv[0]}'
+    detail = ' '.join(result.argv[1:] if result.argv[0]==kubectlPath else result.argv)
+    recordSpan('call',name,time.monotonic()-result.duration,result.duration,bytes,'timeout' if result.timedOut else result.rc,detail[:300])
+    return result
+
+def tracedPhase(function):
+    #every call of a collection phase becomes a span, with its string arguments as detail
+    @functools.wraps(function)
+    def wrapper(*args,**kwargs):
+        start = time.monotonic()
+        rc = 1
+        try:
+            result = function(*args,**kwargs)
+            rc = 0
+            return result
+        finally:
+            recordSpan('phase',function.__name__,start,time.monotonic()-start,rc=rc,detail=' '.join(arg for arg in args if isinstance(arg,str)))
+    return wrapper
+
+def getRunReport():
+    with runSpansLock:
+        spans = sorted(runSpans,key=lambda span: span['start'])
+    summary = {}
+    for span in spans:
+        total = summary.setdefault(span['name'],{'kind':span['kind'],'count':0,'seconds':0,'maxSeconds':0,'bytes':0,'failed':0})
+        total['count'] += 1
+        total['seconds'] = round(total['seconds']+span['duration'],6)
+        total['maxSeconds'] = max(total['maxSeconds'],span['duration'])
+        total['bytes'] += span['bytes'] or 0
+        total['failed'] += span['rc'] not in (0,None)
+    return {'version':1,'startedAt':runStartedAt.strftime('%Y-%m-%dT%H:%M:%SZ'),'arguments':sys.argv[1:],
+        'seconds':round(time.monotonic()-runStart,6),'summary':summary,'spans':spans}
+
+def printSlowest(count):
+    with runSpansLock:
+        spans = sorted(runSpans,key=lambda span: span['duration'],reverse=True)[:count]
+    if not spans:
+        return
+    print(f"Slowest operations of this {time.monotonic()-runStart:.2f}s run:")
+    for span in spans:
+        print(f"  {span['duration']:8.3f}s  {span['name']}  {(span['detail'] or '')[:100]}")
+
+def writeTraceFile(fileName):
+    #Chrome trace events, opened by chrome://tracing or ui.perfetto.dev, one track per thread
+    with runSpansLock:
+        spans = list(runSpans)
+    events = [{'name':'thread_name','ph':'M','pid':os.getpid(),'tid':threadId,'args':{'name':name}}
+        for threadId,name in {span['threadId']:span['thread'] for span in spans}.items()]
+    events += [{'name':span['name'],'cat':span['kind'],'ph':'X','pid':os.getpid(),'tid':span['threadId'],
+        'ts':round(span['start']*1e6),'dur':round(span['duration']*1e6),
+        'args':{'detail':span['detail'],'bytes':span['bytes'],'rc':span['rc']}} for span in spans]
+    with open(fileName,'w') as traceOut:
+        json.dump({'traceEvents':events,'displayTimeUnit':'ms'},traceOut)
+
+def finishRun():
+    if reportTop>0:
+        printSlowest(reportTop)
+    if traceFile!=None:
+        try:
+            writeTraceFile(traceFile)
+            print(f"Wrote trace of this run to {traceFile}.")
+        except OSError as err:
+            print(f"\u001b[31mError: Unable to write the trace to {traceFile}: {err}\u001b[0m")
+
+def getCommandRunner():
+    global commandRunner
+    with commandRunnerLock:
+        if commandRunner==None:
+            commandRunner = CommandRunner(maxProcesses)
+        return commandRunner
+
+def kubectlArgv(*args):
+    context = ['--context',kubeContext] if kubeContext else []
+    return [kubectlPath,*context,*args]
+
+def checkResult(result):
+    if result.timedOut:
+        raise subprocess.TimeoutExpired(result.argv,commandTimeout,result.stdout,result.stderr)
+    if result.rc!=0:
+        raise subprocess.CalledProcessError(result.rc,result.argv,result.stdout,result.stderr)
+    return result
+
+def runKubectl(*args,stdout=None):
+    return checkResult(getCommandRunner().run(kubectlArgv(*args),commandTimeout,stdout))
+
+def openKubectl(*args):
+    return getCommandRunner().open(kubectlArgv(*args),commandTimeout)
+
+def describeError(err):
+    #the message of a failed call together with what kubectl printed on stderr
+    stderr = err.stderr.decode(errors='replace').strip() if isinstance(err,subprocess.SubprocessError) and err.stderr else ''
+    return f"{err}\n{stderr}" if stderr else str(err)
+
+
+class KubectlBackend:
+    #every call starts the kubectl binary through the command runner
+    def getList(self,kinds,fed=None):
+        namespace = ['-n',fed] if fed!=None else []
+        return json.loads(runKubectl('get',kinds,*namespace,'-o','json').stdout.decode())
+
+    def openLogs(self,fed,instance,container,options):
+        return openKubectl('logs',instance,'-n',fed,'-c',container,*options)
+
+    def openExec(self,fed,instance,container,*command):
+        return openKubectl('exec','-n',fed,instance,'-c',container,'--',*command)
+
+    def runExec(self,fed,instance,container,*command):
+        return runKubectl('exec','-n',fed,instance,'-c',container,'--',*command)
+
+    def copyFile(self,fed,instance,container,path,destination):
+        runKubectl('cp',f'{fed}/{instance}:{path}',destination,'-c',container)
+
+class ApiStream:
+    #body of a pod log request, read like a CommandStream: a read returns what arrived rather than waiting for size bytes,
+    #which a followed log may never send
+    def __init__(self,backend,path):
+        self.backend = backend
+        self.argv = ['GET',path]
+        self.start = time.monotonic()
+        self.timedOut = False
+        self.bytesRead = 0
+        self.connection,self.response = backend.request(path)
+        self.error = self.response.read() if self.response.status!=200 else b''
+
+    def read(self,size=-1):
+        if self.error:
+            return b''
+        try:
+            data = self.response.read1(size) if size!=None and size>=0 else self.response.read()
+            self.bytesRead += len(data)
+            return data
+        except socket.timeout:
+            self.timedOut = True
+            raise subprocess.TimeoutExpired(self.argv,commandTimeout)
+
+    def close(self,kill=False):
+        if not kill and not self.timedOut and not self.error:
+            try:
+                while self.read(65536):
+                    pass
+            except subprocess.TimeoutExpired:
+                pass
+        self.backend.release(self.connection,self.response)
+        rc = 0 if self.response.status==200 else self.response.status
+        return recordCall(CommandResult(self.argv,rc,b'',self.error,time.monotonic()-self.start,self.timedOut),self.bytesRead)
+
+    def interrupt(self):
+        #shutting the socket down wakes a read blocked on it in another thread
+        try:
+            self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except (OSError,AttributeError):
+            pass
+
+class ApiExecStream:
+    #exec session over a websocket speaking v4.channel.k8s.io: every message starts with its channel,
+    #1 is stdout, 2 is stderr and 3 carries the final status of the command
+    def __init__(self,backend,fed,instance,container,command):
+        query = urllib.parse.urlencode([('container',container),('stdout','true'),('stderr','true')]+[('command',part) for part in command])
+        path = f'/api/v1/namespaces/{fed}/pods/{instance}/exec?{query}'
+        self.argv = ['exec',instance,'-c',container,'--',*command]
+        self.start = time.monotonic()
+        self.timedOut = False
+        self.done = False
+        self.buffer = b''
+        self.stderr = b''
+        self.status = b''
+        self.channel = None
+        self.bytesRead = 0
+        self.connection = backend.connect()
+        headers = dict(backend.headers)
+        headers.update({'Connection':'Upgrade','Upgrade':'websocket','Sec-WebSocket-Version':'13',
+            'Sec-WebSocket-Key':base64.b64encode(os.urandom(16)).decode(),'Sec-WebSocket-Protocol':'v4.channel.k8s.io'})
+        self.connection.request('GET',backend.basePath+path,headers=headers)
+        response = self.connection.getresponse()
+        if response.status!=101:
+            self.done = True
+            self.stderr = response.read()
+            self.status = json.dumps({'status':'Failure','code':response.status}).encode()
+        #after the upgrade the socket carries websocket frames, read through the response's buffered file
+        self.response = response
+        self.socketFile = response.fp
+
+    def readExactly(self,size):
+        data = self.socketFile.read(size)
+        if len(data)<size:
+            raise EOFError("The exec session ended in the middle of a frame.")
+        return data
+
+    def receive(self):
+        header = self.socketFile.read(2)
+        if len(header)<2:
+            self.done = True
+            return
+        opcode = header[0]&0x0f
+        length = header[1]&0x7f
+        if length==126:
+            length = int.from_bytes(self.readExactly(2),'big')
+        elif length==127:
+            length = int.from_bytes(self.readExactly(8),'big')
+        mask = self.readExactly(4) if header[1]&0x80 else None
+        payload = self.readExactly(length)
+        if mask!=None:
+            payload = bytes(byte^mask[i%4] for i,byte in enumerate(payload))
+        if opcode==8:
+            self.done = True
+            return
+        if opcode in (1,2):
+            if not payload:
+                return
+            self.channel,payload = payload[0],payload[1:]
+        elif opcode!=0:
+            #pings and pongs carry no output
+            return
+        if self.channel==1:
+            self.buffer += payload
+        elif self.channel==2:
+            self.stderr = (self.stderr+payload)[-64*1024:]
+        elif self.channel==3:
+            self.status += payload
+
+    def read(self,size=-1):
+        try:
+            while not self.done and (not self.buffer or size==None or size<0):
+                self.receive()
+        except socket.timeout:
+            self.timedOut = True
+            raise subprocess.TimeoutExpired(self.argv,commandTimeout)
+        size = len(self.buffer) if size==None or size<0 else size
+        data = self.buffer[:size]
+        self.buffer = self.buffer[len(data):]
+        self.bytesRead += len(data)
+        return data
+
+    def getReturnCode(self):
+        if not self.status:
+            return -9 if not self.done else 1
+        status = json.loads(self.status.decode())
+        if status.get('status')=='Success':
+            return 0
+        for cause in status.get('details',{}).get('causes',[]):
+            if cause.get('reason')=='ExitCode':
+                return int(cause['message'])
+        return 1
+
+    def close(self,kill=False):
+        if not kill and not self.timedOut:
+            try:
+                while self.read(65536):
+                    pass
+            except (subprocess.TimeoutExpired,EOFError):
+                pass
+        self.response.close()
+        self.connection.close()
+        return recordCall(CommandResult(self.argv,self.getReturnCode(),b'',self.stderr,time.monotonic()-self.start,self.timedOut),self.bytesRead)
+
+class ApiBackend:
+    #talks to the API server over pooled keep-alive connections instead of starting kubectl (and re-reading
+    #kubeconfig, TLS setup and discovery) for every call; the kubeconfig is read once through kubectl itself
+    listPaths = {'namespaces':('/api/v1/namespaces','v1','Namespace'),
+        'pod':('/api/v1/namespaces/{fed}/pods','v1','Pod'),
+        'deployment':('/apis/apps/v1/namespaces/{fed}/deployments','apps/v1','Deployment')}
+    kindNames = {'namespace':'namespaces','namespaces':'namespaces','ns':'namespaces','pod':'pod','pods':'pod','po':'pod','deployment':'deployment','deployments':'deployment','deploy':'deployment'}
+
+    def __init__(self):
+        try:
+            config = json.loads(runKubectl('config','view','--flatten','--minify','-o','json').stdout.decode())
+        except subprocess.SubprocessError as err:
+            abortCollection("Couldn't read the kubeconfig for the api backend.",describeError(err))
+        cluster = config['clusters'][0]['cluster']
+        user = config['users'][0]['user'] if config.get('users') else {}
+        if 'exec' in user or 'auth-provider' in user:
+            abortCollection("The api backend doesn't support credential plugins, please use '--backend kubectl'.")
+        server = urllib.parse.urlsplit(cluster['server'])
+        self.https = server.scheme=='https'
+        self.host = server.hostname
+        self.port = server.port
+        self.basePath = server.path.rstrip('/')
+        self.headers = {}
+        if user.get('token'):
+            self.headers['Authorization'] = f"Bearer {user['token']}"
+        elif user.get('username'):
+            self.headers['Authorization'] = 'Basic '+base64.b64encode(f"{user['username']}:{user.get('password','')}".encode()).decode()
+        self.sslContext = self.getSslContext(cluster,user) if self.https else None
+        self.pool = queue.LifoQueue()
+
+    def getSslContext(self,cluster,user):
+        if cluster.get('insecure-skip-tls-verify'):
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        elif cluster.get('certificate-authority-data'):
+            context = ssl.create_default_context(cadata=base64.b64decode(cluster['certificate-authority-data']).decode())
+        else:
+            context = ssl.create_default_context()
+        if user.get('client-certificate-data'):
+            #ssl only loads client certificates from files, so they live in a private directory just long enough to be read
+            with tempfile.TemporaryDirectory() as certDir:
+                for name,key in (('client.crt','client-certificate-data'),('client.key','client-key-data')):
+                    with open(os.open(f'{certDir}/{name}',os.O_WRONLY|os.O_CREAT,0o600),'wb') as certFile:
+                        certFile.write(base64.b64decode(user[key]))
+                context.load_cert_chain(f'{certDir}/client.crt',f'{certDir}/client.key')
+        return context
+
+    def connect(self):
+        if self.https:
+            return http.client.HTTPSConnection(self.host,self.port,timeout=commandTimeout,context=self.sslContext)
+        return http.client.HTTPConnection(self.host,self.port,timeout=commandTimeout)
+
+    def request(self,path):
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            connection = self.connect()
+        try:
+            connection.request('GET',self.basePath+path,headers=self.headers)
+            return connection,connection.getresponse()
+        except (OSError,http.client.HTTPException):
+            #a pooled connection the server already closed is replaced once
+            connection.close()
+            connection = self.connect()
+            connection.request('GET',self.basePath+path,headers=self.headers)
+            return connection,connection.getresponse()
+
+    def release(self,connection,response):
+        #only a connection whose response was read to the end can carry the next request
+        if response.isclosed() and not response.will_close:
+            self.pool.put(connection)
+        else:
+            connection.close()
+
+    def getList(self,kinds,fed=None):
+        items = []
+        for kind in kinds.split(','):
+            path,apiVersion,kindName = self.listPaths[self.kindNames[kind]]
+            stream = ApiStream(self,path.format(fed=fed))
+            body = stream.read()
+            checkResult(stream.close())
+            for item in json.loads(body.decode())['items']:
+                #list responses leave kind and apiVersion out of their items
+                items.append({'apiVersion':apiVersion,'kind':kindName,**item})
+        return {'kind':'List','apiVersion':'v1','items':items}
+
+    def openLogs(self,fed,instance,container,options):
+        query = [('container',container)]
+        for option in options:
+            name,_,value = option.lstrip('-').partition('=')
+            if name=='since-time':
+                query.append(('sinceTime',value))
+            elif name=='timestamps':
+                query.append(('timestamps','true'))
+            elif name=='since':
+                query.append(('sinceSeconds',str(getDurationSeconds(value))))
+            elif name=='tail':
+                query.append(('tailLines',value))
+            elif name=='follow':
+                query.append(('follow','true'))
+        return ApiStream(self,f'/api/v1/namespaces/{fed}/pods/{instance}/log?{urllib.parse.urlencode(query)}')
+
+    def openExec(self,fed,instance,container,*command):
+        return ApiExecStream(self,fed,instance,container,command)
+
+    def runExec(self,fed,instance,container,*command):
+        stream = self.openExec(fed,instance,container,*command)
+        try:
+            output = stream.read()
+        except BaseException:
+            stream.close(kill=True)
+            raise
+        return checkResult(stream.close()._replace(stdout=output))
+
+    def copyFile(self,fed,instance,container,path,destination):
+        #kubectl cp is an exec of tar as well, unpacked here into the destination file
+        directory,fileName = os.path.split(path)
+        stream = self.openExec(fed,instance,container,'tar','cf','-','-C',directory or '/',fileName)
+        try:
+            with tarfile.open(fileobj=stream,mode='r|') as podTar, open(destination,'wb') as outFile:
+                for member in podTar:
+                    if member.isfile():
+                        shutil.copyfileobj(podTar.extractfile(member),outFile)
+        except BaseException:
+            stream.close(kill=True)
+            raise
+        checkResult(stream.close())
+
+def getDurationSeconds(duration):
+    units = {'h':3600,'m':60,'s':1}
+    return sum(int(value)*units[unit] for value,unit in re.findall(r'(\d+)([hms])',duration))
+
+def getBackend():
+    global clusterBackend
+    with backendLock:
+        if clusterBackend==None:
+            #the first call to the cluster is where the run stops being a quick argument check
+            loadLazyModules()
+            clusterBackend = ApiBackend() if backendName=='api' else KubectlBackend()
+        return clusterBackend
+
+class ParallelGzipWriter:
+    #pigz-style gzip: the tar stream is cut into blocks that are compressed as separate gzip members
+    #on a thread pool, and gunzip/tarfile read the concatenated members back as one stream
+    def __init__(self,fileObj,level,threads,blockSize=1024*1024):
+        self.fileObj = fileObj
+        self.level = level
+        self.threads = threads
+        self.blockSize = blockSize
+        self.buffer = bytearray()
+        self.pending = deque()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        #[uncompressed,compressed] start of every block, the seek points of an --index
+        self.blocks = []
+        self.rawOffset = 0
+        self.compressedOffset = 0
+
+    def write(self,data):
+        self.buffer += data
+        while len(self.buffer)>=self.blockSize:
+            self.submit(bytes(self.buffer[:self.blockSize]))
+            del self.buffer[:self.blockSize]
+        return len(data)
+
+    def submit(self,block):
+        self.pending.append((len(block),self.pool.submit(gzip.compress,block,self.level,mtime=0)))
+        #blocks are written in order, and only a couple per thread are kept in memory
+        while len(self.pending)>2*self.threads:
+            self.writeBlock()
+
+    def writeBlock(self):
+        size,future = self.pending.popleft()
+        data = future.result()
+        self.blocks.append([self.rawOffset,self.compressedOffset])
+        self.fileObj.write(data)
+        self.rawOffset += size
+        self.compressedOffset += len(data)
+
+    def close(self):
+        if self.buffer:
+            self.submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.writeBlock()
+        self.pool.shutdown()
+        self.fileObj.close()
+
+class IndexedMember:
+    #cuts a text member into chunks at line ends and records each chunk's time range, levels and tokens
+    def __init__(self,index,name,size):
+        self.index = index
+        self.fileId = len(index.files)
+        self.record = {'name':name,'offset':None,'size':size,'first':None,'last':None,'lines':0,'levels':{}}
+        index.files.append(self.record)
+        self.buffer = bytearray()
+        self.position = 0
+
+    def feed(self,data):
+        self.buffer += data
+        while len(self.buffer)>=indexChunkSize:
+            end = self.buffer.rfind(b'\n',0,indexChunkSize)+1 or indexChunkSize
+            self.addChunk(bytes(self.buffer[:end]))
+            del self.buffer[:end]
+
+    def addChunk(self,chunk):
+        times = timestampPattern.findall(chunk)
+        first = min(times).decode().replace(' ','T') if times else None
+        last = max(times).decode().replace(' ','T') if times else None
+        levels = {level.decode():count for level,count in Counter(levelPattern.findall(chunk)).items()}
+        chunkId = len(self.index.chunks)
+        self.index.chunks.append([self.fileId,self.position,len(chunk),first,last,levels])
+        for token in set(match.lower() for match in tokenPattern.findall(chunk)):
+            self.index.tokens.setdefault(token.decode(),[]).append(chunkId)
+        record = self.record
+        if first!=None:
+            record['first'] = first if record['first']==None else min(record['first'],first)
+            record['last'] = last if record['last']==None else max(record['last'],last)
+        record['lines'] += chunk.count(b'\n')
+        for level,count in levels.items():
+            record['levels'][level] = record['levels'].get(level,0)+count
+        self.position += len(chunk)
+
+    def finish(self,offset):
+        if self.buffer:
+            self.addChunk(bytes(self.buffer))
+            self.buffer = bytearray()
+        #where the member's data starts in the uncompressed tar stream
+        self.record['offset'] = offset
+
+class IndexingReader:
+    #hands everything tarfile copies out of a member to its IndexedMember on the way
+    def __init__(self,fileObj,member):
+        self.fileObj = fileObj
+        self.member = member
+
+    def read(self,size=-1):
+        data = self.fileObj.read(size)
+        self.member.feed(data)
+        return data
+
+class ArchiveIndex:
+    #what --index knows about an archive: files with their time ranges and level counts, chunks of those files,
+    #and for every UE id/error code the chunks mentioning it, so 'query' only decompresses the chunks it needs
+    def __init__(self,indexName,compression):
+        self.indexName = indexName
+        self.compression = compression
+        self.files = []
+        self.chunks = []
+        self.tokens = {}
+
+    def wants(self,name):
+        #a long stream is archived as name.part0000, .part0001... and each part is indexed on its own
+        return re.sub(r'\.part\d{4}$','',name).endswith(('.txt','.log'))
+
+    def startMember(self,name,size):
+        return IndexedMember(self,name,size)
+
+    def save(self,blocks=None):
+        writeJsonAtomic(self.indexName,{'version':1,'compression':self.compression,'blocks':blocks,'files':self.files,'chunks':self.chunks,'tokens':self.tokens},gzip.open,separators=(',',':'))
+
+@functools.lru_cache(maxsize=None)
+def getArchiveFile():
+    #defined on first use, subclassing tarfile.TarFile at startup would load tarfile for every run
+    class ArchiveFile(tarfile.TarFile):
+        #tarfile that also closes the compressor it is written through, and feeds text members to the --index
+        compressor = None
+        index = None
+
+        def addfile(self,tarinfo,fileobj=None):
+            if self.index==None or fileobj==None or not self.index.wants(tarinfo.name):
+                return super().addfile(tarinfo,fileobj)
+            member = self.index.startMember(tarinfo.name,tarinfo.size)
+            super().addfile(tarinfo,IndexingReader(fileobj,member))
+            #the member's data ends on the last block boundary before the new end of the archive
+            member.finish(self.offset-tarfile.BLOCKSIZE*((tarinfo.size+tarfile.BLOCKSIZE-1)//tarfile.BLOCKSIZE))
+
+        def close(self):
+            try:
+                super().close()
+            finally:
+                blocks = getattr(self.compressor,'blocks',None)
+                if self.compressor!=None:
+                    self.compressor.close()
+                    self.compressor = None
+            if self.index!=None:
+                self.index.save(blocks)
+                self.index = None
+    return ArchiveFile
+
+def openArchive(archiveName):
+    level = compressionLevel if compressionLevel!=None else compressionFormats[compression][1]
+    #an indexed gz archive is always written in blocks, so a query can start decompressing close to any chunk
+    ArchiveFile = getArchiveFile()
+    if compression=='gz' and compressThreads<=1 and not indexArchive:
+        archive = ArchiveFile.open(archiveName,'w:gz',compresslevel=level)
+    elif compression=='xz':
+        archive = ArchiveFile.open(archiveName,'w:xz',preset=level)
+    elif compression=='none':
+        archive = ArchiveFile.open(archiveName,'w')
+    else:
+        if compression=='gz':
+            compressor = ParallelGzipWriter(open(archiveName,'wb'),level,max(compressThreads,1))
+        else:
+            import zstandard
+            compressor = zstandard.ZstdCompressor(level=level,threads=compressThreads if compressThreads>1 else 0).stream_writer(open(archiveName,'wb'))
+        archive = ArchiveFile.open(fileobj=compressor,mode='w|')
+        archive.compressor = compressor
+    if indexArchive:
+        archive.index = ArchiveIndex(f'{archiveName}.idx',compression)
+    return archive
+
+class StreamingArchive:
+    #tar.gz that collectors write members into as they are produced, shared by the --parallel workers
+    def __init__(self,archiveName,rootName):
+        self.archiveName = archiveName
+        self.writer = logPipeline.ArchiveWriter(openArchive(archiveName),rootName,spoolSize)
+
+    def addBytes(self,fileName,data):
+        if getattr(workerState,'pending',None)!=None:
+            workerState.pending.append((fileName,io.BytesIO(data),len(data)))
+            workerState.pendingBytes += len(data)
+            return
+        self.writer.addBytes(fileName,data)
+
+    def addMember(self,fileName,fileObj,size=None):
+        #a stream of unknown size goes in chunks, one that fits is held like the other members of its task, the parts
+        #of a longer one are added right away and emptied again if the attempt fails (extraction keeps the last copy)
+        if size==None:
+            parts = []
+            if getattr(workerState,'pending',None)!=None:
+                workerState.undo.append(lambda: [self.writer.addBytes(part,b'') for part in parts])
+            size = self.writer.addChunks(fileName,fileObj,parts,self.addBytes)
+            if parts and getattr(workerState,'pending',None)!=None:
+                workerState.streamedBytes += size
+            return
+        #inside a task every member is spooled and only added once the whole task succeeded, so that a failed
+        #attempt leaves neither a cut off member nor a duplicate of its retry in the archive; the members of a task
+        #share its part of --memory-limit, what doesn't fit waits in a temporary file until the commit
+        if getattr(workerState,'pending',None)!=None:
+            budget = spoolSize-workerState.pendingBytes
+            spool = tempfile.SpooledTemporaryFile(max_size=budget) if budget>0 else tempfile.TemporaryFile()
+            try:
+                shutil.copyfileobj(fileObj,spool)
+            except BaseException:
+                spool.close()
+                raise
+            workerState.pending.append((fileName,spool,spool.tell()))
+            if spool.tell()<=budget:
+                workerState.pendingBytes += spool.tell()
+            return
+        self.writer.addMember(fileName,fileObj,size)
+
+    def commit(self,pending):
+        self.writer.commit(pending)
+
+    def close(self):
+        self.writer.close()
+
+    def discard(self):
+        self.writer.close()
+        os.remove(self.archiveName)
+        if os.path.exists(f'{self.archiveName}.idx'):
+            os.remove(f'{self.archiveName}.idx')
+
+class LogParser(argparse.ArgumentParser):
+    def error(self, message):
+        self.print_help()
+        #handling errors when invalid arguments are passed.
+        if message.startswith('unrecognized arguments'):
+            print(f"\n\u001b[31mError: {message}\nPlease enter the arguments from the given choices.\u001b[0m")
+        else:
+            print(f"\u001b[31{message}\u001b[0m")
+        print(exitMessage)
+        sys.exit(2)
+
+def signalHandler(signum,frame):
+    global tarDir
+    if commandRunner!=None:
+        commandRunner.killAll()
+    cleanUp()
+    print("\nUser interrupt captured. \nCleaning up and exiting...")
+    exit()
+
+signal.signal(signal.SIGINT,signalHandler)
+signal.signal(signal.SIGTSTP,signalHandler)
+
+def cleanUp():
+    global tarDir,streamArchive
+    #a dry run never holds the target's lock, the directories it points at may be those of a collection running right now
+    if dryRun:
+        return
+    #deletes unempty directories
+    if os.path.exists(tarDir):
+        shutil.rmtree(tarDir)
+    #a partially streamed archive is removed as well
+    if streamArchive!=None:
+        streamArchive.discard()
+        streamArchive = None
+    if fanoutDir!=None and os.path.exists(fanoutDir):
+        shutil.rmtree(fanoutDir)
+
+def fail(message,hint=None):
+    #ends the run on an argument error, with what it staged removed (a dry run removes nothing, see cleanUp())
+    if hint!=None:
+        print(hint)
+    print(f"\u001b[31mError: {message}\u001b[0m")
+    cleanUp()
+    print(exitMessage)
+    exit()
+
+def abortCollection(message,detail=None):
+    #inside a pool worker the failure belongs to that instance, so it is handed back instead of removing tarDir
+    if getattr(workerState,'active',False):
+        raise CollectionError(f"{detail}\n{message}" if detail else message)
+    if detail:
+        print(f"\u001b[31m{detail}")
+    print(f"\u001b[31m{message} Cleaning up and exiting...\u001b[0m")
+    cleanUp()
+    exit()
+
+def writeAtomic(path,write,mode='w',opener=open):
+    #written to a temporary file first so a concurrent run (or worker) never reads half a file
+    os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}'
+    with opener(temporary,mode) as tempFile:
+        write(tempFile)
+    os.replace(temporary,path)
+
+def writeJsonAtomic(path,data,opener=open,**options):
+    writeAtomic(path,lambda jsonFile: json.dump(data,jsonFile,**options),'wt',opener)
+
+def getTimestamp():
+    # gmt stores current gmtime
+    gmt = time.gmtime()
+    # ts stores timestamp
+    ts = calendar.timegm(gmt)
+    return ts
+
+def getArchiveName(fed):
+    ts = getTimestamp()
+    #incremental archives only hold the delta since the archive named in their incremental.json
+    suffix = '-incremental' if incremental else ''
+    return f'{fed}-Logs_{ts}{suffix}{compressionFormats[compression][0]}'
+
+def getTargetName(fed):
+    return f'{kubeContext}/{fed}' if kubeContext else fed
+
+def getTargetKey(fed):
+    #file name safe form of the target, contexts may look like arn:aws:eks:region:account:cluster/name
+    return re.sub(r'[^\w.-]','_',getTargetName(fed))
+
+def loadCheckpoint(fed):
+    global checkpoint
+    try:
+        with open(f'{stateDir}/checkpoints/{getTargetKey(fed)}.json') as checkpointFile:
+            checkpoint = json.load(checkpointFile)
+    except (OSError,ValueError):
+        checkpoint = {}
+    return checkpoint
+
+def saveCheckpoint(fed,archiveName):
+    #containers not collected in this run, or that logged nothing yet, keep the time of their last collection
+    containers = dict(checkpoint.get('containers',{}))
+    containers.update((key,stamp) for key,stamp in collectedAt.items() if stamp!=None)
+    writeJsonAtomic(f'{stateDir}/checkpoints/{getTargetKey(fed)}.json',{'archive':os.path.abspath(fanoutArchive or archiveName),'containers':containers},indent=2)
+
+def getCheckpointTime(instance,workerNode):
+    #node time of the last line the previous run collected from the container, None without --incremental
+    return checkpoint.get('containers',{}).get(f'{instance}/{workerNode}') if incremental else None
+
+def getSinceOption(instance,workerNode):
+    #a container seen by the previous run only needs what was logged after the last line that run collected
+    if getCheckpointTime(instance,workerNode)!=None:
+        option = [f"--since-time={getCheckpointTime(instance,workerNode)}"]
+    elif logsSinceTime!=None:
+        option = [f"--since-time={logsSinceTime}"]
+    elif logsSince!=None:
+        option = [f"--since={logsSince}"]
+    else:
+        option = []
+    #lines before the --window aren't even sent when its start is later
+    if windowStart!=None and (not option or option[0].startswith('--since-time=') and getQueryTime(option[0].split('=',1)[1])<windowStart):
+        return [f"--since-time={windowStart}Z"]
+    return option
+
+def storeIncrementalInfo():
+    since = {}
+    for key in collectedAt:
+        instance,workerNode = key.split('/',1)
+        option = getSinceOption(instance,workerNode)
+        since[key] = option[0].split('=',1)[1] if option else None
+    storeText('incremental.json',json.dumps({'previousArchive':checkpoint.get('archive'),'since':since},indent=2)+'\n')
+
+def getFailures(fed,archiveName):
+    return {'fed':fed,'context':kubeContext,'archive':os.path.abspath(fanoutArchive or archiveName),'tasks':failedTasks}
+
+def saveFailures(fed,archiveName):
+    #next to the archive for --rerun, a target of a fan-out names it after the consolidated archive and itself
+    failuresName = f'{fanoutArchive}.{getTargetKey(fed)}.failed.json' if fanoutArchive else f'{archiveName}.failed.json'
+    with open(failuresName,'w') as failuresFile:
+        json.dump(getFailures(fed,archiveName),failuresFile,indent=2)
+    #tasks the --budget cut off or never started are listed as well, but didn't fail
+    unfinished = sum(1 for task in failedTasks if task['error'] in (budgetSkipped,budgetCut))
+    failed = len(failedTasks)-unfinished
+    summary = ' and '.join(([f"{failed} tasks failed"] if failed else [])+([f"{unfinished} tasks weren't finished within the --budget"] if unfinished else []))
+    print(f"\u001b[{31 if failed else 33}m{summary}, collect only them again with: kubectl logCollect --rerun {failuresName}\u001b[0m")
+
+@tracedPhase
+def archiveItems(fed,parser):
+    global tarDir,streamArchive
+    if dryRun:
+        printPlan(fed)
+        return
+    archiveName = streamArchive.archiveName if streamArchive!=None else getArchiveName(fed)
+    if incremental:
+        storeIncrementalInfo()
+    if dedupRefs:
+        storeDedupInfo()
+    if failedTasks:
+        storeText('failed.json',json.dumps(getFailures(fed,archiveName),indent=2)+'\n')
+    #the report ends here, the compression of the archive only shows in --report-top and --trace-file
+    storeText('runReport.json',json.dumps(getRunReport(),indent=1)+'\n')
+    #in streaming mode the members are already in the archive
+    if streamArchive!=None:
+        streamArchive.close()
+        streamArchive = None
+        print("\u001b[32mArchived log files successfully.\u001b[0m")
+        if collectedAt:
+            saveCheckpoint(fed,archiveName)
+        if failedTasks:
+            saveFailures(fed,archiveName)
+        saveTaskSizes(fed)
+        return
+    # storing as .tar.gz file by default, --compression picks the algorithm
+    with openArchive(archiveName) as tf:
+        try:
+            tf.add(tarDir,arcname=os.path.basename(tarDir))
+        except:
+            print("\u001b[31mError: Unable to archive files at the moment. Cleaning up and exiting...\u001b[0m")
+            shutil.rmtree(tarDir)
+            exit()
+        print("\u001b[32mArchived log files successfully.\u001b[0m")
+    if collectedAt:
+        saveCheckpoint(fed,archiveName)
+    if failedTasks:
+        saveFailures(fed,archiveName)
+    saveTaskSizes(fed)
+    print("Cleaning up...")
+    #deletes unempty directories
+    shutil.rmtree(tarDir)
+
+def getList(message,kinds,fed=None):
+    #nothing can be collected without the lists, so they are retried before giving up on the run
+    for attempt in range(retries+1):
+        try:
+            return getBackend().getList(kinds,fed)
+        except (subprocess.SubprocessError,OSError,http.client.HTTPException,ValueError) as err:
+            if attempt==retries:
+                abortCollection(message,describeError(err))
+            time.sleep(getRetryDelay(attempt))
+
+@tracedPhase
+def getNamespaces():
+    namespaces = getList("Couldn't retrieve feds at the moment.",'namespaces')
+    return [item['metadata']['name'] for item in namespaces['items']]
+
+@tracedPhase
+def loadClusterSnapshot(fed):
+    global clusterSnapshot
+    #a single list call answers every pod, container, image, deployment and port lookup of the run
+    items = getList(f"Couldn't retrieve pods and deployments of {fed} at the moment.",'deployment,pod',fed)['items']
+    clusterSnapshot[fed] = {
+        'pods':[item for item in items if item['kind']=='Pod'],
+        'deployments':{item['metadata']['name']:item for item in items if item['kind']=='Deployment'}
+    }
+    #later runs only need the names, containers and images of the pods to check their arguments and plan a --dry-run
+    writeTopology(fed,deployments=clusterSnapshot[fed]['deployments'],pods=[{'metadata':{'name':pod['metadata']['name']},
+        'spec':{'containers':[{'name':container['name'],'image':container.get('image')} for container in pod['spec']['containers']]}}
+        for pod in clusterSnapshot[fed]['pods']])
+    return clusterSnapshot[fed]
+
+def getSnapshot(fed):
+    if fed not in clusterSnapshot:
+        loadClusterSnapshot(fed)
+    return clusterSnapshot[fed]
+
+def getDeployment(fed,pod):
+    deployments = getSnapshot(fed)['deployments']
+    if pod not in deployments:
+        abortCollection(f"Couldn't find the deployment for {pod} in {fed}.")
+    return deployments[pod]
+
+def yamlScalar(value):
+    #JSON scalars are valid YAML, and quoting keeps strings such as 'on' or '0755' from changing type
+    return json.dumps(value)
+
+#words a YAML 1.1 parser reads as booleans or null when they aren't quoted
+yamlWords = {'y','yes','n','no','true','false','on','off','null'}
+
+def yamlKey(key):
+    #a plain key starting with a letter can only change type as one of the yamlWords, numbers, dates and '.inf' start otherwise
+    if re.fullmatch(r'[A-Za-z_][A-Za-z0-9_./-]*',key) and key.lower() not in yamlWords:
+        return key
+    return json.dumps(key)
+
+def toYaml(value,indent=0):
+    pad = '  '*indent
+    lines = []
+    if isinstance(value,dict):
+        for key,item in value.items():
+            key = yamlKey(key)
+            if isinstance(item,dict) and item:
+                lines.append(f"{pad}{key}:")
+                lines.extend(toYaml(item,indent+1))
+            elif isinstance(item,list) and item:
+                #lists stay at the indentation of their key, like kubectl prints them
+                lines.append(f"{pad}{key}:")
+                lines.extend(toYaml(item,indent))
+            else:
+                lines.append(f"{pad}{key}: {yamlScalar(item)}")
+    else:
+        for item in value:
+            if isinstance(item,(dict,list)) and item:
+                nested = toYaml(item,indent+1)
+                nested[0] = f"{pad}- {nested[0].lstrip()}"
+                lines.extend(nested)
+            else:
+                lines.append(f"{pad}- {yamlScalar(item)}")
+    return lines
+
+def storeDeploymentList(fed):
+    return list(getSnapshot(fed)['deployments'].keys())
+
+def readPortCacheFile(fed):
+    try:
+        with open(f'{stateDir}/ports/{getTargetKey(fed)}.json') as cacheFile:
+            return json.load(cacheFile)
+    except (OSError,ValueError):
+        return {}
+
+def writePortCacheFile(fed,pod,port):
+    #one file per target like the checkpoints, whose lock leaves a single run to update it, so the targets
+    #of a fan-out don't overwrite each other's ports
+    cachedPorts = readPortCacheFile(fed)
+    cachedPorts[pod] = {'port':port,'time':getTimestamp()}
+    writeJsonAtomic(f'{stateDir}/ports/{getTargetKey(fed)}.json',cachedPorts)
+
+def lookupPort(fed,pod):
+    #first containerPort of the deployment, as the grep over its YAML used to return
+    for container in getDeployment(fed,pod)['spec']['template']['spec']['containers']:
+        for port in container.get('ports',[]):
+            if 'containerPort' in port:
+                return str(port['containerPort'])
+    abortCollection(f"Couldn't retrieve container port for {pod} at the moment.")
+
+@tracedPhase
+def getPort(fed,pod):
+    global portCache
+    with portCacheLock:
+        if (fed,pod) in portCache:
+            return portCache[(fed,pod)]
+        if portCacheTtl>0:
+            cached = readPortCacheFile(fed).get(pod)
+            if cached and getTimestamp()-cached['time']<portCacheTtl:
+                portCache[(fed,pod)] = cached['port']
+                return cached['port']
+        port = lookupPort(fed,pod)
+        portCache[(fed,pod)] = port
+        if portCacheTtl>0:
+            writePortCacheFile(fed,pod,port)
+        return port
+
+def getKubeconfigStamp():
+    #'kubectl config use-context' rewrites the kubeconfig, which makes what was cached for the current context stale
+    paths = (os.environ.get('KUBECONFIG') or os.path.expanduser('~/.kube/config')).split(os.pathsep)
+    return [os.path.getmtime(path) if os.path.exists(path) else None for path in paths]
+
+def readTopology(name):
+    #what an earlier run listed for the context (and fed), as long as it is younger than --topology-ttl
+    if topologyTtl<=0:
+        return None
+    try:
+        with open(f'{stateDir}/topology/{getTargetKey(name)}.json') as topologyFile:
+            topology = json.load(topologyFile)
+    except (OSError,ValueError):
+        return None
+    if time.time()-topology.get('time',0)>=topologyTtl or topology.get('kubeconfig')!=getKubeconfigStamp():
+        return None
+    return topology
+
+def writeTopology(name,**topology):
+    if topologyTtl<=0:
+        return
+    writeJsonAtomic(f'{stateDir}/topology/{getTargetKey(name)}.json',{'time':time.time(),'kubeconfig':getKubeconfigStamp(),**topology})
+
+def getFedList(fed):
+    #a fed among the recently listed namespaces needs no call, any other one is looked up again in case it is new;
+    #namespaces aren't named like feds, so '_namespaces' never collides with the topology of a fed
+    topology = readTopology('_namespaces')
+    if topology!=None and fed in topology['namespaces']:
+        return topology['namespaces']
+    fedList = getNamespaces()
+    writeTopology('_namespaces',namespaces=fedList)
+    return fedList
+
+def checkTargetArguments(fed,args):
+    #a '-p' or '-d' the fed doesn't have is reported before the lock is taken and anything is collected,
+    #the prefixes come from the config and a deployment the cached topology knows needs no call
+    if args.pod!=None and args.pod not in debugCliData and not args.onlydebug:
+        fail(f"The pod '{args.pod}' doesn't exist in this cluster. Please enter the name of the pod from the above choices.",
+            f"If you wish to debug a specific pod in a fed, please specify the pod from {list(debugCliData.keys())} as argument to '-p'.")
+    topology = readTopology(fed)
+    if args.debuglogs not in (None,'all') and (topology==None or args.debuglogs not in topology['deployments']):
+        deploymentList = storeDeploymentList(fed)
+        if args.debuglogs not in deploymentList:
+            fail(f"{args.debuglogs} is not supported at the moment. Please specify a pod from {deploymentList} or 'all' as argument to '-d'.")
+    #a '-c' is checked for every kind of run, a typo would otherwise fail a task on every pod
+    if args.container!=None:
+        deploymentList = storeDeploymentList(fed)
+        if args.debuglogs==None:
+            fail(f"Please specify the pod from {deploymentList} as argument to '-d'.")
+        selected = deploymentList if args.debuglogs=='all' else [args.debuglogs]
+        if not any(args.container in getWorkerNodes(fed,key) for key in selected):
+            fail(f"{args.container} doesn't exist in {args.debuglogs}.",f"Containers present in {args.debuglogs}: {getContainerChoices(fed,selected)}.")
+
+def makeTarDir():
+    global tarDir
+    #create directory
+    if os.path.exists(tarDir):
+        pass
+    else:
+        os.makedirs(tarDir)
+
+def stagedPath(fileName):
+    #a file written by a task is removed again when the task fails, so that its retry starts clean
+    makeTarDir()
+    path = f'{tarDir}/{fileName}'
+    if getattr(workerState,'undo',None)!=None:
+        workerState.undo.append(lambda: os.path.exists(path) and os.remove(path))
+        workerState.staged.append(path)
+    return path
+
+def storeText(fileName,text,dedup=False):
+    global tarDir
+    if dryRun:
+        dryRunPlan.append((fileName,len(text.encode()),True))
+        return
+    if dedup and dedupArtifacts:
+        storeDeduplicated(fileName,io.BytesIO(text.encode()))
+        return
+    if streamArchive!=None:
+        streamArchive.addBytes(fileName,text.encode())
+        return
+    with open(stagedPath(fileName), 'w') as filePtr:
+        filePtr.write(text)
+
+def getBlobPath(digest):
+    return f'{stateDir}/blobs/{digest[:2]}/{digest}'
+
+def knownBlob(fileName,digest,size,source):
+    #content already in the store is referenced instead of stored, new content is added to the store for the next runs
+    path = getBlobPath(digest)
+    if os.path.exists(path):
+        #the time of the last reference, so the store can be pruned by age
+        os.utime(path)
+        with dedupLock:
+            dedupRefs[fileName] = {'sha256':digest,'size':size}
+        if getattr(workerState,'undo',None)!=None:
+            workerState.undo.append(lambda: dedupRefs.pop(fileName,None))
+        return True
+    source.seek(0)
+    writeAtomic(path,lambda blobFile: shutil.copyfileobj(source,blobFile),'wb')
+    source.seek(0)
+    return False
+
+def storeDeduplicated(fileName,fileObj):
+    #hashed while it is spooled, so an artifact is read from the cluster only once
+    digest = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=spoolSize) as spool:
+        for data in iter(lambda: fileObj.read(1024*1024),b''):
+            digest.update(data)
+            spool.write(data)
+        size = spool.tell()
+        if knownBlob(fileName,digest.hexdigest(),size,spool):
+            return
+        if streamArchive!=None:
+            streamArchive.addMember(fileName,spool,size)
+        else:
+            with open(stagedPath(fileName),'wb') as filePtr:
+                shutil.copyfileobj(spool,filePtr)
+
+def deduplicateFile(fileName):
+    #a file already copied into tarDir is removed again when the store holds it
+    digest = hashlib.sha256()
+    with open(f'{tarDir}/{fileName}','rb') as filePtr:
+        for data in iter(lambda: filePtr.read(1024*1024),b''):
+            digest.update(data)
+        if not knownBlob(fileName,digest.hexdigest(),filePtr.tell(),filePtr):
+            return
+    os.remove(f'{tarDir}/{fileName}')
+
+def storeDedupInfo():
+    storeText('dedup.json',json.dumps({'store':os.path.abspath(f'{stateDir}/blobs'),'files':dict(sorted(dedupRefs.items()))},indent=2)+'\n')
+
+class LineFilter:
+    #--grep, --log-level and --window over whole buffers of lines: each regex removes every line that doesn't match
+    #in a single call, and the window is cut out of the time ordered lines by bisection
+    def __init__(self,grep,level,start,end):
+        self.grep = grep
+        self.levels = [name for name,rank in logLevelRanks.items() if rank>=logLevelRanks[level]] if level!=None else None
+        self.start = start.encode() if start!=None else None
+        self.end = end.encode() if end!=None else None
+        self.patterns = []
+        if self.levels!=None:
+            #a level is a word between non-letters, like the grep -E of podCommands() reads it
+            self.patterns.append(re.compile(rb'^(?![^\n]*(?<![A-Za-z])(?:'+'|'.join(self.levels).encode()+rb')(?![A-Za-z]))[^\n]*\n?',re.M))
+        if grep!=None:
+            self.patterns.append(re.compile(rb'^(?![^\n]*(?:'+grep.encode()+rb'))[^\n]*\n?',re.M))
+
+    def match(self,lines):
+        for pattern in self.patterns:
+            lines = pattern.sub(b'',lines)
+        return lines
+
+    def filter(self,lines):
+        #returns the lines that are kept, and whether a line past the end of the window was reached
+        ended = False
+        if self.start!=None or self.end!=None:
+            lines,ended = self.cutWindow(lines)
+        return self.match(lines),ended
+
+    def stampAt(self,lines,i):
+        #lines without a timestamp of their own belong to the line above
+        while i>=0:
+            stamp = timestampPattern.search(lines[i],0,64)
+            if stamp!=None:
+                return stamp.group().replace(b' ',b'T')
+            i -= 1
+        return b''
+
+    def findLine(self,lines,bound,past):
+        low,high = 0,len(lines)
+        while low<high:
+            mid = (low+high)//2
+            stamp = self.stampAt(lines,mid)
+            if stamp>bound or (stamp==bound and not past):
+                high = mid
+            else:
+                low = mid+1
+        return low
+
+    def cutWindow(self,data):
+        lines = data.splitlines(True)
+        low = self.findLine(lines,self.start,False) if self.start!=None else 0
+        high = self.findLine(lines,self.end,True) if self.end!=None else len(lines)
+        return b''.join(lines[low:high]),high<len(lines)
+
+    def podCommands(self):
+        #the same filters for grep and awk in the pod, where the timestamp is looked for in the first 64 characters too
+        commands = []
+        if self.levels!=None:
+            commands.append(f"grep -E -e {shlex.quote('(^|[^A-Za-z])('+'|'.join(self.levels)+')([^A-Za-z]|$)')}")
+        if self.grep!=None:
+            commands.append(f"grep -E -e {shlex.quote(self.grep)}")
+        if self.start!=None or self.end!=None:
+            stamp = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][T ][0-9][0-9]:[0-9][0-9]:[0-9][0-9]'
+            program = f'match(substr($0,1,64),/{stamp}/) {{ t=substr(substr($0,1,64),RSTART,19); sub(/ /,"T",t) }} t!="" && t>=start && (end=="" || t<=end)'
+            commands.append(f"awk -v start={shlex.quote((self.start or b'').decode())} -v end={shlex.quote((self.end or b'').decode())} {shlex.quote(program)}")
+        return commands
+
+class FilteredStream:
+    #what is left of a log stream after the LineFilter, read like the stream itself
+    def __init__(self,stream,lineFilter):
+        self.stream = stream
+        self.lineFilter = lineFilter
+        self.carry = b''
+        self.output = bytearray()
+        self.eof = False
+        self.ended = False
+
+    def read(self,size=-1):
+        while not self.eof and (size==None or size<0 or len(self.output)<size):
+            data = self.stream.read(1024*1024)
+            if not data:
+                self.eof = True
+                data,self.carry = self.carry,b''
+            else:
+                #only whole lines are filtered, the unfinished one waits for the next read unless it keeps growing
+                data = self.carry+data
+                cut = data.rfind(b'\n')+1
+                data,self.carry = data[:cut],data[cut:]
+                if len(self.carry)>1024*1024:
+                    data,self.carry = data+self.carry,b''
+            data,self.ended = self.lineFilter.filter(data)
+            self.output += data
+            if self.ended:
+                self.eof = True
+        size = len(self.output) if size==None or size<0 else size
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def close(self,kill=False):
+        if self.ended and not kill:
+            #everything after the end of the window was left unread on purpose
+            return self.stream.close(kill=True)._replace(rc=0,timedOut=False)
+        return self.stream.close(kill)
+
+def getPodFilter():
+    #shell function of the batched script and storeLogs, filtering and capping a debugCli file in place inside the pod
+    commands = logFilter.podCommands() if logFilter!=None else []
+    if not commands and not maxFileBytes:
+        return 'filterFile() { :; }\n'
+    body = ''
+    #one command at a time, a pipeline only reports the last one: grep exits with 1 when no line matched, anything
+    #higher is an error that leaves the file as it was and fails the task
+    for command in commands:
+        body += f'''    rc=0
+    {command} < "$1" > "$1.filtered" || rc=$?
+    [ $rc -le 1 ] || {{ rm -f "$1.filtered"; return $rc; }}
+    mv "$1.filtered" "$1"
+'''
+    if maxFileBytes:
+        #like TailStream, the tail starts at its first whole line
+        body += f'''    if [ "$(wc -c < "$1")" -gt {maxFileBytes} ]; then
+        tail -c {maxFileBytes} "$1" | sed 1d > "$1.filtered"
+        mv "$1.filtered" "$1"
+    fi
+'''
+    return f'filterFile() {{\n{body}}}\n'
+
+class TailBuffer:
+    #ring buffer keeping the last capacity bytes written to it, in memory up to spoolSize and in a temporary file above
+    def __init__(self,capacity):
+        self.capacity = capacity
+        self.store = bytearray() if capacity<=spoolSize else tempfile.TemporaryFile()
+        self.written = 0
+        self.readPosition = None
+
+    def put(self,offset,data):
+        if isinstance(self.store,bytearray):
+            #grows with the file, up to the capacity
+            if len(self.store)<offset:
+                self.store.extend(bytes(offset-len(self.store)))
+            self.store[offset:offset+len(data)] = data
+        else:
+            self.store.seek(offset)
+            self.store.write(data)
+
+    def write(self,data):
+        if len(data)>self.capacity:
+            self.written += len(data)-self.capacity
+            data = data[-self.capacity:]
+        offset = self.written%self.capacity
+        first = min(len(data),self.capacity-offset)
+        self.put(offset,data[:first])
+        if first<len(data):
+            self.put(0,data[first:])
+        self.written += len(data)
+
+    def read(self,size=-1):
+        #oldest byte first, wrapping around the end of the store
+        if self.readPosition==None:
+            self.readPosition = max(0,self.written-self.capacity)
+        remaining = self.written-self.readPosition
+        offset = self.readPosition%self.capacity
+        size = remaining if size==None or size<0 else min(size,remaining)
+        size = min(size,self.capacity-offset)
+        if isinstance(self.store,bytearray):
+            data = bytes(self.store[offset:offset+size])
+        else:
+            self.store.seek(offset)
+            data = self.store.read(size)
+        self.readPosition += len(data)
+        return data
+
+    def close(self):
+        if not isinstance(self.store,bytearray):
+            self.store.close()
+        self.store = bytearray()
+
+class TailStream:
+    #reads a whole stream through a TailBuffer of --max-file-size and hands out only its last whole lines
+    def __init__(self,stream,capacity):
+        self.stream = stream
+        self.buffer = TailBuffer(capacity)
+        self.pending = None
+
+    def fill(self):
+        for data in iter(lambda: self.stream.read(1024*1024),b''):
+            self.buffer.write(data)
+        self.pending = b''
+        if self.truncated():
+            #the first line was cut by the ring, it is dropped unless the whole tail is one line
+            for head in iter(lambda: self.buffer.read(64*1024),b''):
+                self.pending += head
+                if b'\n' in head:
+                    self.pending = self.pending[self.pending.find(b'\n')+1:]
+                    break
+
+    def truncated(self):
+        return self.buffer.written>self.buffer.capacity
+
+    def read(self,size=-1):
+        if self.pending==None:
+            self.fill()
+        if self.pending:
+            size = len(self.pending) if size==None or size<0 else size
+            data,self.pending = self.pending[:size],self.pending[size:]
+            return data
+        return self.buffer.read(size)
+
+    def close(self,kill=False):
+        self.buffer.close()
+        return self.stream.close(kill)
+
+class StampedStream:
+    #the lines of 'kubectl logs --timestamps' without the timestamps the node put in front of them: the last one is
+    #the checkpoint of the container, and lines up to the checkpoint they were fetched after are dropped
+    def __init__(self,stream,since=None):
+        self.stream = stream
+        self.since = timestampKey(since) if since!=None else None
+        self.last = None
+        self.carry = b''
+        self.output = bytearray()
+        self.eof = False
+        #whether the next data continues a line too long to be held at once, and whether that line is dropped
+        self.inLine = False
+        self.dropLine = False
+
+    def strip(self,data):
+        kept = b''
+        if self.inLine:
+            #the rest of a cut line has no timestamp of its own
+            cut = data.find(b'\n')+1 or len(data)
+            kept = b'' if self.dropLine else data[:cut]
+            self.inLine = not data[:cut].endswith(b'\n')
+            data = data[cut:]
+        #--since-time includes lines at the checkpoint itself, the previous archive has them already
+        while self.since!=None and data:
+            cut = data.find(b'\n')+1 or len(data)
+            if timestampKey(data[:cut].split(b' ',1)[0].decode(errors='replace'))>self.since:
+                self.since = None
+                break
+            self.inLine,self.dropLine = not data[:cut].endswith(b'\n'),True
+            data = data[cut:]
+        if data:
+            start = data.rfind(b'\n',0,len(data)-1)+1
+            self.last = data[start:].split(b' ',1)[0].decode(errors='replace')
+            self.inLine,self.dropLine = not data.endswith(b'\n'),False
+        return kept+stampPrefix.sub(b'',data)
+
+    def read(self,size=-1):
+        while not self.eof and (size==None or size<0 or len(self.output)<size):
+            data = self.stream.read(1024*1024)
+            if not data:
+                self.eof = True
+                data,self.carry = self.carry,b''
+            else:
+                #like FilteredStream, an unfinished line waits for the next read unless it keeps growing
+                data = self.carry+data
+                cut = data.rfind(b'\n')+1
+                data,self.carry = data[:cut],data[cut:]
+                if len(self.carry)>1024*1024:
+                    data,self.carry = data+self.carry,b''
+            self.output += self.strip(data)
+        size = len(self.output) if size==None or size<0 else size
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def close(self,kill=False):
+        return self.stream.close(kill)
+
+def storeContainerLogs(fileName,fed,instance,workerNode,options,since=None):
+    global tarDir
+    #the container's logs become the file, or the archive member when streaming, and the node time of their last line
+    #is returned: it is the checkpoint, so a jump host clock that is ahead of the node's can't make a later run skip lines
+    stream = stamped = StampedStream(getBackend().openLogs(fed,instance,workerNode,options+['--timestamps']),since)
+    if logFilter!=None:
+        stream = FilteredStream(stream,logFilter)
+    if maxFileBytes:
+        stream = TailStream(stream,maxFileBytes)
+    try:
+        if streamArchive!=None:
+            streamArchive.addMember(fileName,stream)
+        else:
+            with open(stagedPath(fileName), 'wb') as logfile:
+                shutil.copyfileobj(stream,logfile)
+    except BaseException:
+        stream.close(kill=True)
+        raise
+    if maxFileBytes and stream.truncated():
+        print(f"{fileName} has {stream.buffer.written/1024/1024:.1f} MB of logs, keeping the last {maxFileBytes//1024//1024} MB.")
+    checkResult(stream.close())
+    return stamped.last
+
+def streamPodFile(fileName,fed,instance,pod,dedup=False):
+    #the same tar stream that 'kubectl cp' reads, copied member by member into the archive
+    stream = getBackend().openExec(fed,instance,pod,'tar','cf','-','-C','/tmp',fileName)
+    try:
+        with tarfile.open(fileobj=stream,mode='r|') as podTar:
+            for member in podTar:
+                if member.isfile() and dedup:
+                    storeDeduplicated(fileName,podTar.extractfile(member))
+                elif member.isfile():
+                    streamArchive.addMember(fileName,podTar.extractfile(member),member.size)
+    except BaseException:
+        stream.close(kill=True)
+        raise
+    checkResult(stream.close())
+
+@tracedPhase
+def storeLogs(fileName,fed,instance,pod,dedup=False):
+    global tarDir
+    dedup = dedup and dedupArtifacts
+    try:
+        if logFilter!=None or maxFileBytes:
+            getBackend().runExec(fed,instance,pod,'sh','-c',getPodFilter()+'filterFile "$1"','sh',f'/tmp/{fileName}')
+        if streamArchive!=None:
+            streamPodFile(fileName,fed,instance,pod,dedup)
+        else:
+            getBackend().copyFile(fed,instance,pod,f'/tmp/{fileName}',stagedPath(fileName))
+            if dedup:
+                deduplicateFile(fileName)
+    except (subprocess.SubprocessError,tarfile.TarError,OSError,http.client.HTTPException,EOFError) as err:
+        abortCollection("Couldn't retrieve logs at the moment.",describeError(err))
+    try:
+        port = getPort(fed,pod)
+        getBackend().runExec(fed,instance,pod,'curl','-sS','-X','DELETE',f'http://127.0.0.1:{port}{debugCliEndpoints[pod]}/delete/{fileName}')
+    except (subprocess.SubprocessError,OSError,http.client.HTTPException,EOFError) as err:
+        abortCollection(f"Couldn't delete logs from {instance} at the moment.",describeError(err))
+
+@tracedPhase
+def storeDebugLogs(fed,instance,pod,workerNode):
+    since = getCheckpointTime(instance,workerNode)
+    try:
+        lastLine = storeContainerLogs(f'{fed}-{instance}-{workerNode}-debugLogs.txt',fed,instance,workerNode,getSinceOption(instance,workerNode),since)
+    except (subprocess.SubprocessError,OSError,http.client.HTTPException) as err:
+        abortCollection(f"Couldn't retrieve debug logs for {workerNode} of {instance} at the moment.",describeError(err))
+    with checkpointLock:
+        collectedAt[f'{instance}/{workerNode}'] = lastLine or since
+
+@tracedPhase
+def storeTriageLogs(fed,instance,pod,workerNode,tail=None):
+    #a deeper pass replaces the file of the one before only once its own fetch is complete
+    fileName = f'{fed}-{instance}-{workerNode}-debugLogs.txt'
+    since = getCheckpointTime(instance,workerNode)
+    options = getSinceOption(instance,workerNode)+([f'--tail={tail}'] if tail else [])
+    try:
+        lastLine = storeContainerLogs(f'{fileName}.part',fed,instance,workerNode,options,since)
+    except (subprocess.SubprocessError,OSError,http.client.HTTPException) as err:
+        abortCollection(f"Couldn't retrieve debug logs for {workerNode} of {instance} at the moment.",describeError(err))
+    os.replace(f'{tarDir}/{fileName}.part',f'{tarDir}/{fileName}')
+    triageDepth[f'{instance}/{workerNode}'] = f'last {tail} lines' if tail else 'full'
+    if tail==None:
+        with checkpointLock:
+            collectedAt[f'{instance}/{workerNode}'] = lastLine or since
+
+def getContainerPriority(pod,container):
+    #containers of pods that aren't running, aren't ready or were restarted come first, the most restarted before the others
+    status = next((status for status in pod.get('status',{}).get('containerStatuses',[]) if status.get('name')==container),{})
+    unhealthy = pod.get('status',{}).get('phase')!='Running' or not status.get('ready',False) or 'running' not in status.get('state',{'running':{}})
+    return (unhealthy,status.get('restartCount',0))
+
+def stopAtDeadline():
+    #transfers still running when the budget is spent are cut, their tasks are undone and listed in failed.json
+    if commandRunner!=None:
+        commandRunner.killAll()
+
+def collectTriage(fed,args,parser):
+    global deadline
+    #the last tenth of the budget is left for writing the archive
+    deadline = runStart+args.budget*0.9
+    timer = threading.Timer(max(deadline-time.monotonic(),0),stopAtDeadline)
+    timer.daemon = True
+    timer.start()
+    print(f"Storing pods and deployments of {fed}...")
+    storeInstance(fed)
+    deploymentList = storeDeploymentList(fed)
+    selected = deploymentList if args.debuglogs in (None,'all') else [args.debuglogs]
+    containers = []
+    for key in selected:
+        storeDeployment(fed,key)
+        workerNodes = getWorkerNodes(fed,key)
+        if args.container:
+            workerNodes = [args.container] if args.container in workerNodes else []
+        containers += [(getContainerPriority(pod,workerNode),pod['metadata']['name'],key,workerNode)
+            for pod in getSnapshot(fed)['pods'] if pod['metadata']['name'].startswith(key) for workerNode in workerNodes if workerNode]
+    containers.sort(key=lambda container: container[0],reverse=True)
+    failedBefore = len(failedTasks)
+    print(f"Storing the last {args.triage_lines} lines of {len(containers)} containers, failing ones first...")
+    runTasks([(f"{instance}/{workerNode}",storeTriageLogs,(fed,instance,key,workerNode,args.triage_lines)) for priority,instance,key,workerNode in containers])
+    #the full pass covers the same containers, so only its failures are kept for --rerun
+    del failedTasks[failedBefore:]
+    #passes started after the deadline only list their tasks as skipped in failed.json, so --rerun can complete them
+    if time.monotonic()<deadline:
+        print("Deepening to the full debug logs...")
+    runTasks([(f"{instance}/{workerNode}",storeTriageLogs,(fed,instance,key,workerNode)) for priority,instance,key,workerNode in containers])
+    if not args.onlydebug:
+        if time.monotonic()<deadline:
+            print("Storing debugCli logs...")
+        instances = list(dict.fromkeys(instance for priority,instance,key,workerNode in containers))
+        instances += [instance for instance in getPodList(fed) if instance not in instances]
+        runTasks([(instance,storeInstanceLogs,(instance,fed,parser,args.pod,args.verbose)) for instance in instances])
+    timer.cancel()
+    if time.monotonic()>=deadline:
+        print(f"\u001b[33mThe --budget of {args.budget}s ran out, archiving what was collected...\u001b[0m")
+    storeText('triage.json',json.dumps(triageDepth,indent=2,sort_keys=True)+'\n')
+    archiveItems(fed,parser)
+
+@tracedPhase
+def storeDeployment(fed,pod):
+    deployment = getDeployment(fed,pod)
+    storeText(f'{fed}-{pod}-deployment.yaml','\n'.join(toYaml(deployment))+'\n',dedup=True)
+
+class BatchedFiles:
+    #splits the output of batchedScript back into (fileName, size) entries, the entry's body is then read from the object itself
+    def __init__(self,stream):
+        self.stream = stream
+        self.buffer = b''
+        self.remaining = 0
+
+    def fill(self):
+        chunk = self.stream.read(65536)
+        self.buffer += chunk
+        return chunk!=b''
+
+    def read(self,size=-1):
+        if self.remaining==0:
+            return b''
+        if not self.buffer and not self.fill():
+            raise EOFError("The batched debugCli output ended in the middle of a file.")
+        size = self.remaining if size==None or size<0 else min(size,self.remaining)
+        data = self.buffer[:size]
+        self.buffer = self.buffer[len(data):]
+        self.remaining -= len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            #whatever the caller left of the previous body is skipped
+            while self.read(65536):
+                pass
+            while b'\n' not in self.buffer:
+                if not self.fill():
+                    if self.buffer:
+                        raise EOFError("The batched debugCli output ended in the middle of a header.")
+                    return
+            header,_,self.buffer = self.buffer.partition(b'\n')
+            size,fileName = header.decode().split(None,1)
+            self.remaining = int(size)
+            yield fileName,self.remaining
+
+@tracedPhase
+def storeBatchedLogs(fed,instance,pod,endpoints):
+    global tarDir
+    port = getPort(fed,pod)
+    try:
+        stream = getBackend().openExec(fed,instance,pod,'sh','-c',getPodFilter()+batchedScript,'sh',port,debugCliEndpoints[pod],*endpoints)
+    except (OSError,http.client.HTTPException) as err:
+        abortCollection("Couldn't retrieve logs at the moment.",describeError(err))
+    try:
+        files = BatchedFiles(stream)
+        for i,(fileName,size) in enumerate(files):
+            #the common configs come first when they were requested
+            if i==0 and endpoints[0]=='/common' and dedupArtifacts:
+                storeDeduplicated(fileName,files)
+            elif streamArchive!=None:
+                streamArchive.addMember(fileName,files,size)
+            else:
+                with open(stagedPath(fileName),'wb') as logfile:
+                    shutil.copyfileobj(files,logfile)
+    except (subprocess.SubprocessError,tarfile.TarError,EOFError,ValueError,OSError,http.client.HTTPException) as err:
+        stream.close(kill=True)
+        abortCollection("Couldn't retrieve logs at the moment.",describeError(err))
+    try:
+        checkResult(stream.close())
+    except subprocess.SubprocessError as err:
+        abortCollection("Couldn't retrieve logs at the moment.",describeError(err))
+
+#fetching file name
+@tracedPhase
+def getFileName(fed,instance,parser,pod,isCommon=False,isVerbose=False):
+    port = getPort(fed,pod)
+    if(isCommon):
+        endpoint,kind = '/common','common logs'
+    elif(isVerbose):
+        endpoint,kind = '/verbose','verbose logs'
+    else:
+        endpoint,kind = '','logs'
+    try:
+        result = getBackend().runExec(fed,instance,pod,'curl','-sS','-X','GET',f'http://127.0.0.1:{port}{debugCliEndpoints[pod]}/logCollect{endpoint}')
+    except (subprocess.SubprocessError,OSError,http.client.HTTPException,EOFError) as err:
+        abortCollection(f"Couldn't retrieve {kind} at the moment.",describeError(err))
+    if result.stderr.decode()!='':
+        abortCollection(f"Couldn't retrieve {kind} at the moment.",result.stderr.decode())
+    fileName = result.stdout.decode().strip()
+    #common configs rarely change between runs, so only they go through the --dedup store
+    storeLogs(fileName,fed,instance,pod,isCommon)
+
+def getContainers(pod,field):
+    return [container[field] for container in pod['spec']['containers']]
+
+@tracedPhase
+def getContainerChoices(fed,deployments):
+    return list(dict.fromkeys(workerNode for key in deployments for workerNode in getWorkerNodes(fed,key) if workerNode))
+
+def getWorkerNodes(fed,pod):
+    #containers of the first pod whose container list mentions the deployment name
+    for instance in getSnapshot(fed)['pods']:
+        workerNodes = getContainers(instance,'name')
+        if pod in ','.join(workerNodes):
+            return workerNodes
+    return ['']
+
+@tracedPhase
+def storeInstance(fed):
+    pods = getSnapshot(fed)['pods']
+    #store information of pods to file, laid out like 'kubectl get po -o custom-columns'
+    rows = [['POD','CONTAINER','IMAGE']]
+    rows += [[pod['metadata']['name'],','.join(getContainers(pod,'name')),','.join(getContainers(pod,'image'))] for pod in pods]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    storeText(f'{fed}-podsInformation.txt',''.join('   '.join(value.ljust(widths[i]) for i,value in enumerate(row)).rstrip()+'\n' for row in rows),dedup=True)
+    return getPodList(fed)
+
+def getPodList(fed):
+    return [pod['metadata']['name'] for pod in getSnapshot(fed)['pods']]
+
+def claimCommonLogs(pod):
+    global debugCliData
+    #common configs are stored once per pod, so the check and the update happen under one lock
+    with debugCliLock:
+        if debugCliData[pod]==False:
+            debugCliData[pod]=True
+            #a failed task hands the common configs to the next instance of the prefix
+            if getattr(workerState,'undo',None)!=None:
+                workerState.undo.append(lambda: debugCliData.update({pod:False}))
+            return True
+        return False
+
+def getRetryDelay(attempt):
+    #exponential backoff, with jitter so the retries of many pods don't hit the API server together
+    return retryBackoff*2**attempt*random.uniform(0.5,1)
+
+def describeTask(task,args):
+    #what failed.json records of a task, enough for --rerun to build it again
+    if task in (storeDebugLogs,storeTriageLogs):
+        fed,instance,pod,workerNode = args[:4]
+        return {'kind':'debugLogs','instance':instance,'deployment':pod,'container':workerNode}
+    instance,fed,parser,pod,isVerbose = args
+    return {'kind':'debugCli','instance':instance,'prefix':pod,'verbose':isVerbose}
+
+def getRerunTasks(tasks,fed,parser):
+    taskList = []
+    for item in tasks:
+        if item['kind']=='debugLogs':
+            taskList.append((f"{item['instance']}/{item['container']}",storeDebugLogs,(fed,item['instance'],item['deployment'],item['container'])))
+        else:
+            taskList.append((item['instance'],storeInstanceLogs,(item['instance'],fed,parser,item['prefix'],item['verbose'])))
+    return taskList
+
+def getTaskKey(task,args):
+    #tasks of the same deployment/container or debugCli prefix store about as much on every instance
+    if task==storeTriageLogs:
+        return None
+    item = describeTask(task,args)
+    if item['kind']=='debugLogs':
+        return f"debugLogs/{item['deployment']}/{item['container']}"
+    prefixes = [prefix for prefix in debugCliEndpoints if item['instance'].startswith(prefix) and item['prefix'] in (None,prefix)]
+    #an instance without a debugCli prefix has nothing to collect
+    if not prefixes:
+        return None
+    return f"debugCli/{'+'.join(prefixes)}{'/verbose' if item['verbose'] else ''}"
+
+def recordTaskSize(task,args):
+    #only a run without filters tells how much a full collection of the task stores
+    key = getTaskKey(task,args)
+    if key==None or logFilter!=None or maxFileBytes or logsSince!=None or logsSinceTime!=None or incremental:
+        return
+    written = sum(size for fileName,spool,size in workerState.pending or [])+workerState.streamedBytes
+    written += sum(os.path.getsize(path) for path in workerState.staged if os.path.exists(path))
+    with taskSizesLock:
+        taskSizes.setdefault(key,[]).append(written)
+
+def readTaskSizes(fed):
+    try:
+        with open(f'{stateDir}/sizes/{getTargetKey(fed)}.json') as sizesFile:
+            return json.load(sizesFile)
+    except (OSError,ValueError):
+        return {}
+
+def saveTaskSizes(fed):
+    #the average over the instances, the first instance of a prefix also carries its common configs
+    if not taskSizes:
+        return
+    sizes = readTaskSizes(fed)
+    sizes.update({key:sum(written)//len(written) for key,written in taskSizes.items()})
+    writeJsonAtomic(f'{stateDir}/sizes/{getTargetKey(fed)}.json',sizes,indent=2)
+
+def planTasks(taskList):
+    #a task is estimated by what the same deployment/container or prefix stored in an earlier run
+    for label,task,args in taskList:
+        key = getTaskKey(task,args)
+        if key==None:
+            continue
+        size = sizeHistory.get(key)
+        if size!=None and maxFileBytes and key.startswith('debugLogs/'):
+            size = min(size,maxFileBytes)
+        dryRunPlan.append((f"{describeTask(task,args)['kind']} of {label}",size,False))
+
+def printPlan(fed):
+    print(f"Work list of {getTargetName(fed)}, nothing was collected:")
+    for name,size,exact in dryRunPlan:
+        print(f"  {name:<72} {'?' if size==None else f'{size/1024:.1f} KB' if exact else f'~{size/1024:.1f} KB'}")
+    known = [size for name,size,exact in dryRunPlan if size!=None]
+    print(f"\u001b[32m{len(dryRunPlan)} files and tasks, about {sum(known)/1024/1024:.1f} MB before compression.\u001b[0m")
+    if len(known)<len(dryRunPlan):
+        print(f"\u001b[33m{len(dryRunPlan)-len(known)} tasks weren't collected by an earlier run without filters, their size is unknown.\u001b[0m")
+    if logFilter!=None or logsSince!=None or logsSinceTime!=None or incremental:
+        print("\u001b[33mThe estimates are the sizes of a full collection, the filters of this run store less.\u001b[0m")
+
+def runAttempt(task,args):
+    #files, archive members and claims of a failed attempt are undone, so a retry or the archive never sees half a task
+    workerState.active = True
+    workerState.undo = []
+    workerState.staged = []
+    workerState.pending = [] if streamArchive!=None else None
+    workerState.pendingBytes = 0
+    workerState.streamedBytes = 0
+    error = None
+    try:
+        task(*args)
+        recordTaskSize(task,args)
+        if workerState.pending:
+            streamArchive.commit(workerState.pending)
+    except CollectionError as err:
+        error = str(err)
+    except subprocess.SubprocessError as err:
+        error = describeError(err)
+    except Exception as err:
+        error = f"{type(err).__name__}: {err}"
+    if error!=None:
+        for undo in reversed(workerState.undo):
+            undo()
+        for fileName,spool,size in workerState.pending or []:
+            spool.close()
+    workerState.active = False
+    workerState.undo = workerState.staged = workerState.pending = None
+    return error
+
+def runTask(label,task,*args):
+    #runs inside a pool thread and returns the instance's error, if any, instead of exiting
+    instance = describeTask(task,args)['instance']
+    for attempt in range(retries+1):
+        if deadline!=None and time.monotonic()>=deadline:
+            return label,budgetSkipped
+        with failedTasksLock:
+            if breakerThreshold and podFailures[instance]>=breakerThreshold:
+                return label,f"Skipped, {podFailures[instance]} tasks of {instance} already failed in this run."
+        error = runAttempt(task,args)
+        if error==None:
+            return label,None
+        #a transfer killed at the deadline didn't fail, the budget cut it off
+        if deadline!=None and time.monotonic()>=deadline:
+            return label,budgetCut
+        if attempt<retries and (deadline==None or time.monotonic()<deadline):
+            delay = getRetryDelay(attempt)
+            print(f"\u001b[33m{label}: attempt {attempt+1} failed, retrying in {delay:.1f}s...\u001b[0m")
+            time.sleep(delay)
+    #only the task given up counts for the breaker, so one broken container doesn't cost its pod the others
+    with failedTasksLock:
+        podFailures[instance] += 1
+    return label,error
+
+def runTasks(taskList):
+    global tarDir
+    if dryRun:
+        planTasks(taskList)
+        return
+    #created up front so that workers don't race on makedirs
+    if streamArchive==None:
+        os.makedirs(tarDir,exist_ok=True)
+    #without --parallel the tasks run one by one, and --fail-fast aborts on the first error as before
+    if parallelism<=1:
+        results = []
+        for label,task,args in taskList:
+            results.append(runTask(label,task,*args))
+            if failFast and results[-1][1]!=None:
+                print(f"\u001b[31m{label}: {results[-1][1]}\u001b[0m")
+                abortCollection(f"Collection failed for {label}.")
+    else:
+        results = logPipeline.runConcurrently(lambda item: runTask(item[0],item[1],*item[2]),taskList,parallelism)
+    #tasks the --budget left no time for are listed for --rerun too, but they didn't fail
+    failures = [(label,error) for label,error in results if error not in (None,budgetSkipped,budgetCut)]
+    skipped = sum(1 for label,error in results if error==budgetSkipped)
+    cut = sum(1 for label,error in results if error==budgetCut)
+    for label,error in failures:
+        print(f"\u001b[31m{label}: {error}\u001b[0m")
+    if skipped or cut:
+        unfinished = ([f"{cut} were cut off"] if cut else [])+([f"{skipped} weren't started"] if skipped else [])
+        print(f"\u001b[33mOf {len(results)} tasks, {' and '.join(unfinished)} before the --budget ran out.\u001b[0m")
+    if failures and failFast:
+        abortCollection(f"Collection failed for {len(failures)} of {len(results)} tasks.")
+    with failedTasksLock:
+        failedTasks.extend({**describeTask(task,args),'error':error} for (label,task,args),(taskLabel,error) in zip(taskList,results) if error!=None)
+    if failures:
+        print(f"\u001b[31mCollection failed for {len(failures)} of {len(results)} tasks, archiving the others...\u001b[0m")
+
+def storeInstanceLogs(instance,fed,parser,pod=None,isVerbose=False):
+    #if pod value was not entered, every prefix in debugCliData is checked
+    for key in (debugCliData.keys() if pod==None else [pod]):
+        #if it is an instance that starts with the given dictionary of prefixes(pods)
+        if instance.startswith(key):
+            if batchedDebugCli:
+                endpoints = (['/common'] if claimCommonLogs(key) else [])+['/verbose' if isVerbose else '']
+                storeBatchedLogs(fed,instance,key,endpoints)
+                continue
+            #checking if common configs have already been stored for each pod or not
+            if claimCommonLogs(key):
+                getFileName(fed,instance,parser,key,True)
+            getFileName(fed,instance,parser,key,False,isVerbose)
+
+#runs the collected tasks in one go, so no batch waits for the slowest task of the one before, and finally calls archiveItems() to tar the files.
+def storeLogCaller(taskList,fed,parser):
+    runTasks(taskList)
+    archiveItems(fed,parser)
+
+#one task per instance, calling upon the getFileName() to store its logs
+def getLogTasks(podList,fed,parser,pod=None,isVerbose=False):
+    return [(instance,storeInstanceLogs,(instance,fed,parser,pod,isVerbose)) for instance in podList]
+
+def getDebugLogsTasks(podList,workerNodes,fed,pod,worker=None):
+    #if container value was not entered, every container of the pod is stored
+    containers = workerNodes if worker==None else [worker]
+    return [(f"{instance}/{workerNode}",storeDebugLogs,(fed,instance,pod,workerNode)) for instance in podList if instance.startswith(pod) for workerNode in containers]
+
+def openSegment(fileName):
+    level = compressionLevel if compressionLevel!=None else compressionFormats[compression][1]
+    if compression=='gz':
+        return gzip.open(fileName,'wb',compresslevel=level)
+    if compression=='xz':
+        return lzma.open(fileName,'wb',preset=level)
+    if compression=='none':
+        return open(fileName,'wb')
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).stream_writer(open(fileName,'wb'))
+
+class SegmentWriter:
+    #compressed log segments cut by time and size, so following for hours never builds one huge file
+    extensions = {'gz':'.log.gz','xz':'.log.xz','zst':'.log.zst','none':'.log'}
+
+    def __init__(self,fed):
+        self.fed = fed
+        self.index = 0
+        self.file = None
+
+    def open(self):
+        self.index += 1
+        fileName = f'{self.fed}-Follow_{getTimestamp()}_{self.index:04d}{self.extensions[compression]}'
+        print(f"Writing followed logs to {fileName}...")
+        self.file = openSegment(fileName)
+        self.openedAt = time.monotonic()
+        self.written = 0
+
+    def write(self,data):
+        if self.file==None or self.written>=segmentBytes:
+            self.close()
+            self.open()
+        self.file.write(data)
+        self.written += len(data)
+
+    def rotateIfDue(self):
+        if self.file!=None and time.monotonic()-self.openedAt>=segmentSeconds:
+            self.close()
+
+    def close(self):
+        if self.file!=None:
+            self.file.close()
+            self.file = None
+
+def timestampKey(timestamp):
+    #RFC3339Nano drops trailing zeros of the fraction, so it is padded before comparing
+    seconds,_,fraction = timestamp.rstrip('Z').partition('.')
+    return seconds+'.'+fraction.ljust(9,'0')
+
+async def followContainer(fed,instance,workerNode,segments,stopEvent,slots,executor):
+    loop = asyncio.get_running_loop()
+    label = f'{instance}/{workerNode} '.encode()
+    lastSeen = None
+    lastLine = None
+    retryDelay = 1
+    while not stopEvent.is_set():
+        #after a restart the stream resumes from the last line written instead of starting over
+        since = [f'--since-time={lastSeen}'] if lastSeen!=None else (getSinceOption(instance,workerNode) or ['--tail=0'])
+        #--since-time only has seconds, so the stream replays that second: everything up to the last line written is skipped
+        skipping = lastSeen!=None
+        silent = False
+        async with slots:
+            opening = loop.run_in_executor(executor,getBackend().openLogs,fed,instance,workerNode,['--follow','--timestamps',*since])
+            try:
+                stream = await asyncio.shield(opening)
+            except (OSError,subprocess.SubprocessError,http.client.HTTPException) as err:
+                stream = None
+                print(f"\u001b[31mCouldn't follow {workerNode} in {instance}: {err}\u001b[0m")
+            except asyncio.CancelledError:
+                #a stream that opens after all is closed instead of left running
+                await asyncio.wait([opening])
+                if opening.exception()==None:
+                    await loop.run_in_executor(executor,opening.result().close,True)
+                raise
+            partial = b''
+            pending = None
+            try:
+                while stream!=None:
+                    #the stream is read in a thread of its own, a read the task stops waiting for is interrupted below
+                    pending = loop.run_in_executor(executor,stream.read,65536)
+                    chunk = await asyncio.shield(pending)
+                    pending = None
+                    if not chunk:
+                        break
+                    lines = (partial+chunk).split(b'\n')
+                    partial = lines.pop()
+                    #a line without an end is flushed as it is rather than held in memory
+                    if len(partial)>1024*1024:
+                        lines.append(partial)
+                        partial = b''
+                    kept = bytearray()
+                    for line in lines:
+                        timestamp = line.split(b' ',1)[0].decode(errors='replace')
+                        if skipping:
+                            if timestampKey(timestamp)<timestampKey(lastSeen):
+                                continue
+                            if timestampKey(timestamp)==timestampKey(lastSeen):
+                                skipping = line!=lastLine
+                                continue
+                            #the last line written is gone from the log, everything later is new
+                            skipping = False
+                        kept += line+b'\n'
+                        lastSeen,lastLine = timestamp,line
+                        retryDelay = 1
+                    if logFilter!=None:
+                        kept = logFilter.match(bytes(kept))
+                    segments.write(b''.join(label+line for line in kept.splitlines(True)))
+            except subprocess.TimeoutExpired:
+                #silent for --timeout, the stream is attached again in case its connection died quietly
+                silent = True
+            except (OSError,http.client.HTTPException):
+                pass
+            finally:
+                if stream!=None:
+                    if pending!=None:
+                        stream.interrupt()
+                        await asyncio.wait([pending])
+                    await loop.run_in_executor(executor,stream.close,True)
+        if stopEvent.is_set():
+            break
+        if silent:
+            continue
+        print(f"Log stream of {workerNode} in {instance} ended, re-attaching in {retryDelay}s...")
+        try:
+            await asyncio.wait_for(stopEvent.wait(),retryDelay)
+        except asyncio.TimeoutError:
+            pass
+        retryDelay = min(retryDelay*2,30)
+
+def getFollowTargets(fed,pod,worker,reload=False):
+    #runs in an executor thread, so a failed lookup comes back as a CollectionError and the current pods are kept
+    workerState.active = True
+    try:
+        if reload:
+            loadClusterSnapshot(fed)
+        targets = set()
+        for deployment in (storeDeploymentList(fed) if pod=='all' else [pod]):
+            workerNodes = getWorkerNodes(fed,deployment)
+            if '' in workerNodes:
+                continue
+            for instance in getPodList(fed):
+                if instance.startswith(deployment):
+                    targets.update((instance,workerNode) for workerNode in ([worker] if worker else workerNodes))
+        return targets
+    except CollectionError as err:
+        print(f"\u001b[31m{err}\nKeeping the current list of pods.\u001b[0m")
+        return None
+    finally:
+        workerState.active = False
+
+async def followLogs(fed,pod,worker=None):
+    loop = asyncio.get_running_loop()
+    stopEvent = asyncio.Event()
+    signalHandlers = {}
+    for signum in (signal.SIGINT,signal.SIGTERM,signal.SIGTSTP):
+        signalHandlers[signum] = signal.getsignal(signum)
+        loop.add_signal_handler(signum,stopEvent.set)
+    segments = SegmentWriter(fed)
+    #every stream holds a process (or connection) of --max-procs for as long as it runs, one is kept for finding new pods
+    followLimit = maxProcesses-1
+    slots = asyncio.Semaphore(followLimit)
+    executor = concurrent.futures.ThreadPoolExecutor(followLimit)
+    tasks = {}
+    reload = False
+    try:
+        while not stopEvent.is_set():
+            #pods that appeared since the last look are attached, pods that are gone are dropped
+            targets = await loop.run_in_executor(None,getFollowTargets,fed,pod,worker,reload)
+            reload = True
+            if targets!=None:
+                added = targets-tasks.keys()
+                for target in added:
+                    tasks[target] = asyncio.create_task(followContainer(fed,*target,segments,stopEvent,slots,executor))
+                for target in tasks.keys()-targets:
+                    tasks.pop(target).cancel()
+                if not tasks:
+                    print(f"No containers to follow for {pod} at the moment.")
+                elif added and len(tasks)>followLimit:
+                    print(f"\u001b[31mFollowing {followLimit} of {len(tasks)} containers, the others wait for a stream to end. Raise '--max-procs' to follow all of them.\u001b[0m")
+            deadline = loop.time()+followRediscoverSeconds
+            while not stopEvent.is_set() and loop.time()<deadline:
+                segments.rotateIfDue()
+                try:
+                    await asyncio.wait_for(stopEvent.wait(),1)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(),return_exceptions=True)
+        executor.shutdown()
+        segments.close()
+        #the loop would otherwise leave Python's default handlers behind
+        for signum,handler in signalHandlers.items():
+            loop.remove_signal_handler(signum)
+            signal.signal(signum,handler)
+    print("\u001b[32mStopped following logs.\u001b[0m")
+
+def checkCompression(args):
+    levels = {'gz':range(0,10),'xz':range(0,10),'zst':range(1,23),'none':[None]}
+    if args.level!=None and args.level not in levels[args.compression]:
+        return f"The value of '--level' is not valid for {args.compression} compression."
+    if args.compress_threads<1:
+        return "The value of '--compress-threads' must be at least 1."
+    #only looked up, zstandard is imported when the archive is opened
+    if args.compression=='zst' and importlib.util.find_spec('zstandard')==None:
+        return "zst compression needs the 'zstandard' module (pip install zstandard)."
+    return None
+
+def checkSince(args):
+    if args.since!=None and args.since_time!=None:
+        return "Only one of '--since' and '--since-time' can be given."
+    if args.since!=None and not re.fullmatch(r'(\d+[hms])+',args.since):
+        return f"'{args.since}' is not a valid duration for '--since', use values like 30s, 10m or 1h30m."
+    if args.since_time!=None:
+        try:
+            datetime.fromisoformat(args.since_time.replace('Z','+00:00'))
+        except ValueError:
+            return f"'{args.since_time}' is not a valid RFC3339 time for '--since-time', use values like 2024-01-31T10:00:00Z."
+    return None
+
+def getUnportableSyntax(pattern):
+    #the first construct of a --grep pattern that Python's re and grep -E don't read alike, None when there's none
+    i = 0
+    while i<len(pattern):
+        if pattern[i]=='\\':
+            if pattern[i+1:i+2].isalnum():
+                return f"'\\{pattern[i+1]}'"
+            i += 2
+            continue
+        if pattern[i]=='[':
+            start = i+1+pattern.startswith('^',i+1)
+            start += pattern.startswith(']',start)
+            end = pattern.find(']',start)
+            if end<0:
+                return None
+            bracket = pattern[i:end+1]
+            if '\\' in bracket:
+                return "a backslash inside brackets"
+            if '[:' in bracket or '[=' in bracket or '[.' in bracket:
+                return f"the POSIX class in '{bracket}'"
+            i = end+1
+            continue
+        if pattern.startswith('(?',i):
+            return "'(?'"
+        if pattern[i] in '*+?}' and pattern.startswith('?',i+1):
+            return f"the lazy quantifier '{pattern[i:i+2]}'"
+        i += 1
+    return None
+
+def checkFilters(args):
+    if args.grep!=None:
+        #kubectl logs are filtered by Python and debugCli files by grep -E in the pod, so both must read the pattern alike
+        unportable = getUnportableSyntax(args.grep)
+        if unportable!=None:
+            return f"'{args.grep}' uses {unportable}, which grep -E doesn't read like Python. '--grep' takes POSIX extended regular expressions, like [0-9] for \\d."
+        try:
+            re.compile(args.grep.encode())
+        except re.error as err:
+            return f"'{args.grep}' is not a valid regular expression for '--grep': {err}."
+        if shutil.which('grep') and subprocess.run(['grep','-E','-e',args.grep],stdin=subprocess.DEVNULL,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL).returncode>1:
+            return f"'{args.grep}' is not a valid POSIX extended regular expression for '--grep'."
+    if args.window!=None:
+        start,comma,end = args.window.partition(',')
+        if not comma or (start and getQueryTime(start)==None) or (end and getQueryTime(end)==None):
+            return f"'{args.window}' is not a valid '--window', use START,END with RFC3339 times like 2024-01-31T10:00:00Z, either of which may be left out."
+        if start and end and getQueryTime(start)>getQueryTime(end):
+            return "The start of '--window' must not be after its end."
+        if args.incremental or args.follow:
+            return "'--window' can't be combined with '--incremental' or '--follow'."
+    if args.budget!=None:
+        if args.budget<1 or args.triage_lines<1:
+            return "The values of '--budget' and '--triage-lines' must be at least 1."
+        if args.stream or args.follow or args.rerun:
+            return "'--budget' can't be combined with '--stream', '--follow' or '--rerun', its deeper passes replace staged files."
+    if args.follow and args.max_procs<2:
+        return "'--follow' needs '--max-procs' of at least 2, one process is kept for finding new pods."
+    if args.dry_run and (args.follow or args.budget!=None):
+        return "'--dry-run' can't be combined with '--follow' or '--budget', their work depends on what happens while they run."
+    if args.topology_ttl<0:
+        return "The value of '--topology-ttl' can't be negative."
+    return None
+
+def loadConfig(configFile):
+    global debugCliEndpoints,debugCliData,supportedFeds,configTargets
+    #without --config, ~/.logCollect/config.json is read when it exists
+    if configFile==None:
+        configFile = f'{stateDir}/config.json'
+        if not os.path.exists(configFile):
+            return
+    try:
+        with open(configFile) as configPtr:
+            config = json.load(configPtr)
+        debugCliEndpoints = {prefix:path.rstrip('/') for prefix,path in config.get('debugCli',debugCliEndpoints).items()}
+        supportedFeds = list(config.get('feds',supportedFeds))
+        configTargets = list(config.get('targets',[]))
+        if not all(isinstance(target,dict) and target.get('namespace') for target in configTargets):
+            raise ValueError("every entry of 'targets' needs a 'namespace'")
+    except (OSError,ValueError,AttributeError) as err:
+        fail(f"Unable to read the config file {configFile}: {err}")
+    debugCliData = {pod:False for pod in debugCliEndpoints}
+
+def getTargets(args):
+    #(context, fed, parallel, maxProcs) of every target: the config's targets with --all-targets, otherwise every
+    #fed of '-n' in every context of '--context'
+    if args.all_targets:
+        return [(target.get('context'),target['namespace'],target.get('parallel',args.parallel),target.get('maxProcs',args.max_procs)) for target in configTargets]
+    feds = args.namespace.split(',') if args.namespace else [None]
+    contexts = args.context.split(',') if args.context else [None]
+    return [(context,fed,args.parallel,args.max_procs) for context in contexts for fed in feds]
+
+def lockTarget(fed):
+    global targetLock
+    #the lock goes with the process, so a run that died never leaves a stale one behind
+    os.makedirs(f'{stateDir}/locks',exist_ok=True)
+    targetLock = open(f'{stateDir}/locks/{getTargetKey(fed)}.lock','a')
+    try:
+        fcntl.flock(targetLock,fcntl.LOCK_EX|fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"\u001b[31mYou already have an instance of the program running for {getTargetName(fed)}.\u001b[0m")
+        sys.exit(1)
+    targetLock.truncate(0)
+    targetLock.write(f"{os.getpid()}")
+    targetLock.flush()
+
+def collectTarget(target,workDir,archiveName,printLock):
+    context,fed,targetParallel,targetProcs = target
+    label = f'{context}/{fed}' if context else fed
+    targetDir = tempfile.mkdtemp(dir=workDir)
+    #the run of a single target, whose last -n/--context/--parallel/--max-procs override the ones of the fan-out
+    argv = [sys.executable,os.path.abspath(sys.argv[0]),*sys.argv[1:],'-n',fed,'--context',context or '',
+        '--parallel',str(targetParallel),'--max-procs',str(targetProcs),'--fanout-child',os.path.abspath(archiveName)]
+    proc = subprocess.Popen(argv,cwd=targetDir,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+    for line in proc.stdout:
+        with printLock:
+            print(f"[{label}] {line.decode(errors='replace').rstrip()}\u001b[0m",flush=True)
+    proc.wait()
+    archives = [name for name in os.listdir(targetDir) if name.endswith('.tar')]
+    return label,os.path.join(targetDir,archives[0]) if archives else None
+
+@tracedPhase
+def mergeTargets(archiveName,results):
+    #the root directory of every target's archive becomes context/fed in the consolidated one
+    with openArchive(archiveName) as merged:
+        for label,targetArchive in results:
+            with tarfile.open(targetArchive) as tarFile:
+                for member in tarFile:
+                    member.name = '/'.join([label,*member.name.split('/')[1:]])
+                    merged.addfile(member,tarFile.extractfile(member) if member.isfile() else None)
+
+def fanOut(targets,args):
+    global fanoutDir
+    if args.follow:
+        fail("'--follow' follows a single fed of a single context.")
+    feds = sorted(set(fed for context,fed,targetParallel,targetProcs in targets))
+    archiveName = getArchiveName(feds[0] if len(feds)==1 else 'feds')
+    print(f"Collecting from {len(targets)} targets, {args.max_targets} at a time...")
+    loadLazyModules()
+    #the targets are collected by separate runs, each with its own state, lock and concurrency
+    fanoutDir = tempfile.mkdtemp(prefix='.logCollect-',dir='.')
+    printLock = threading.Lock()
+    try:
+        results = logPipeline.runConcurrently(lambda target: collectTarget(target,fanoutDir,archiveName,printLock),targets,args.max_targets)
+        #every target printed its own work list
+        if args.dry_run:
+            return
+        failed = [label for label,targetArchive in results if targetArchive==None]
+        if len(failed)==len(results):
+            abortCollection("Collection failed for every target.")
+        print(f"Consolidating {len(results)-len(failed)} targets into {archiveName}...")
+        mergeTargets(archiveName,[result for result in results if result[1]!=None])
+    finally:
+        shutil.rmtree(fanoutDir,ignore_errors=True)
+        fanoutDir = None
+    print("\u001b[32mArchived log files successfully.\u001b[0m")
+    if failed:
+        print(f"\u001b[31mCollection failed for {len(failed)} of {len(results)} targets: {', '.join(failed)}\u001b[0m")
+
+def readArguments(args,parser):
+    global tarDir,parallelism,dedupArtifacts,spoolSize,memoryLimit,maxFileBytes,reportTop,traceFile,logFilter,windowStart,indexArchive,backendName,batchedDebugCli,portCacheTtl,commandTimeout,maxProcesses,streamArchive,compression,compressionLevel,compressThreads,logsSince,logsSinceTime,incremental,segmentSeconds,segmentBytes
+    global topologyTtl,dryRun,sizeHistory,retries,retryBackoff,breakerThreshold,failFast,rerunTasks,kubeContext,fanoutArchive
+    if args.parallel<1:
+        fail("The value of '--parallel' must be at least 1.")
+    compressionError = checkCompression(args)
+    if compressionError!=None:
+        fail(compressionError)
+    compression = args.compression
+    compressionLevel = args.level
+    compressThreads = args.compress_threads
+    indexArchive = args.index
+    sinceError = checkSince(args)
+    if sinceError!=None:
+        fail(sinceError)
+    logsSince = args.since
+    logsSinceTime = args.since_time
+    incremental = args.incremental
+    filterError = checkFilters(args)
+    if filterError!=None:
+        fail(filterError)
+    if args.grep!=None or args.log_level!=None or args.window!=None:
+        start,comma,end = (args.window or ',').partition(',')
+        windowStart = getQueryTime(start) if start else None
+        logFilter = LineFilter(args.grep,args.log_level,windowStart,getQueryTime(end) if end else None)
+    if args.segment_seconds<1 or args.segment_size<1:
+        fail("The values of '--segment-seconds' and '--segment-size' must be at least 1.")
+    segmentSeconds = args.segment_seconds
+    segmentBytes = args.segment_size*1024*1024
+    parallelism = args.parallel
+    if args.memory_limit<16 or args.max_file_size<0:
+        fail("The value of '--memory-limit' must be at least 16 and '--max-file-size' can't be negative.")
+    memoryLimit = args.memory_limit
+    dedupArtifacts = args.dedup
+    maxFileBytes = args.max_file_size*1024*1024
+    #every member collected at the same time may hold a spool and a tail buffer of this size
+    spoolSize = max(1024*1024,memoryLimit*1024*1024//(2*(parallelism+1)))
+    backendName = args.backend
+    batchedDebugCli = args.batched
+    if args.timeout<1 or args.max_procs<1:
+        fail("The values of '--timeout' and '--max-procs' must be at least 1.")
+    commandTimeout = args.timeout
+    maxProcesses = args.max_procs
+    portCacheTtl = args.port_cache_ttl
+    topologyTtl = args.topology_ttl
+    dryRun = args.dry_run
+    reportTop = 0 if dryRun else args.report_top
+    traceFile = args.trace_file
+    if args.max_targets<1:
+        fail("The value of '--max-targets' must be at least 1.")
+    if args.retries<0 or args.retry_backoff<0 or args.breaker_threshold<0:
+        fail("The values of '--retries', '--retry-backoff' and '--breaker-threshold' can't be negative.")
+    retries = args.retries
+    retryBackoff = args.retry_backoff
+    breakerThreshold = args.breaker_threshold
+    failFast = args.fail_fast
+    if args.rerun!=None:
+        #the fed and context come from the failed run, only its failed tasks are collected
+        try:
+            with open(args.rerun) as failuresFile:
+                failures = json.load(failuresFile)
+            args.namespace,args.context,rerunTasks = failures['fed'],failures['context'] or '',failures['tasks']
+        except (OSError,ValueError,KeyError,TypeError) as err:
+            fail(f"Unable to read the failed tasks in {args.rerun}: {err}")
+        args.all_targets = False
+    loadConfig(args.config)
+    if args.fanout_child!=None:
+        #one target of a fan-out streams an uncompressed archive for the run that consolidates them
+        fanoutArchive = args.fanout_child
+        #a --budget run stages its files, so that deeper passes can replace them
+        args.stream = args.budget==None
+        compression,compressionLevel,compressThreads,indexArchive = 'none',None,1,False
+        reportTop,traceFile = 0,None
+    else:
+        targets = getTargets(args)
+        if args.all_targets and not targets:
+            fail("'--all-targets' needs a 'targets' list in the config file.")
+        if len(targets)>1 or args.all_targets:
+            fanOut(targets,args)
+            print(exitMessage)
+            return
+    kubeContext = args.context or None
+    #storing fed names
+    fedList =[]
+    fedList = getFedList(args.namespace)
+
+    # perform some action only if -n value specified correctly
+    if args.namespace in fedList:
+        print(f"Fed '{args.namespace}' exists in the cluster. Entering execution...")
+        #handling feds apart from the supported ones
+        if args.namespace not in supportedFeds:
+            fail(f"This tool doesn't provide support for {args.namespace} at the moment.")
+        checkTargetArguments(args.namespace,args)
+        #a dry run writes nothing, so it neither waits for nor holds back a collection of the same target
+        if dryRun:
+            sizeHistory = readTaskSizes(args.namespace)
+            topology = readTopology(args.namespace)
+            if topology!=None and args.namespace not in clusterSnapshot:
+                clusterSnapshot[args.namespace] = {'pods':topology['pods'],'deployments':topology['deployments']}
+        else:
+            lockTarget(args.namespace)
+        tarDir = f'/tmp/{getTargetKey(args.namespace)}'
+        #listed once, unless checking the arguments already did
+        getSnapshot(args.namespace)
+        if incremental:
+            loadCheckpoint(args.namespace)
+            if checkpoint.get('archive'):
+                print(f"Collecting debug logs written since {checkpoint['archive']}...")
+        if args.follow:
+            deploymentList = storeDeploymentList(args.namespace)
+            if args.debuglogs!='all' and args.debuglogs not in deploymentList:
+                fail(f"Please specify the pod from {deploymentList} or 'all' as argument to '-d' to follow its debug logs.")
+            print(f"Following debug logs of {args.debuglogs}, press Ctrl-C to stop...")
+            asyncio.run(followLogs(args.namespace,args.debuglogs,args.container))
+            print(exitMessage)
+            return
+        if args.budget!=None:
+            collectTriage(args.namespace,args,parser)
+            print(exitMessage)
+            return
+        if args.stream and not dryRun:
+            streamArchive = StreamingArchive(getArchiveName(args.namespace),os.path.basename(tarDir))
+        if rerunTasks!=None:
+            print(f"Collecting the {len(rerunTasks)} tasks that failed in {args.rerun} again...")
+            runTasks(getRerunTasks(rerunTasks,args.namespace,parser))
+            archiveItems(args.namespace,parser)
+            print(exitMessage)
+            return
+        podList = storeInstance(args.namespace)
+        deploymentList = storeDeploymentList(args.namespace)
+        #the debug logs of every deployment and the logs of every instance are collected by a single runTasks() call
+        taskList = []
+        if args.onlydebug and not(args.debuglogs):
+            fail(f"Please specify the pod from {deploymentList} as argument to '-d' if you wish to store debug logs.")
+        #if -d argument has been entered   
+        elif args.debuglogs in deploymentList:   
+            workerNodes = getWorkerNodes(args.namespace,args.debuglogs)
+            if '' in workerNodes:
+                print(f"No workerNodes available for {args.debuglogs}, skipping debug logs...") 
+            elif args.container:
+                print(f"Storing debug logs for {args.container} node of {args.debuglogs}...")
+                taskList += getDebugLogsTasks(podList,workerNodes,args.namespace,args.debuglogs,args.container)
+            else:
+                print(f"No container was specified for {args.debuglogs}. Storing debug logs for all containers of {args.debuglogs}...")
+                taskList += getDebugLogsTasks(podList,workerNodes,args.namespace,args.debuglogs)
+
+            print(f"Storing deployment files for {args.debuglogs}...")
+            storeDeployment(args.namespace,args.debuglogs)
+
+        elif args.debuglogs == 'all': 
+            print(f"Storing debug logs and deployment files for {deploymentList} in {args.namespace}...")
+            for key in deploymentList:
+                workerNodes = getWorkerNodes(args.namespace,key)
+                if '' in workerNodes:
+                    print(f"No workerNodes available for {key}, skipping debug logs...")
+                else:
+                    taskList += getDebugLogsTasks(podList,workerNodes,args.namespace,key)
+                storeDeployment(args.namespace,key)
+        elif args.debuglogs!=None:
+            fail(f"{args.debuglogs} is not supported at the moment. Please specify a pod from {deploymentList} as argument to '-d'.")
+        else:
+            pass
+        if args.onlydebug:
+            storeLogCaller(taskList,args.namespace,parser)
+        
+        if not(args.onlydebug):
+            #storing data for particular pod only
+            if args.pod:
+                if args.pod in debugCliData:
+                    print(f"Storing logs for {args.pod}...")
+                    storeLogCaller(taskList+getLogTasks(podList,args.namespace,parser,args.pod,args.verbose),args.namespace,parser)
+                else:
+                    fail(f"The pod '{args.pod}' doesn't exist in this cluster. Please enter the name of the pod from the above choices.",
+                        f"If you wish to debug a specific pod in a fed, please specify the pod from {list(debugCliData.keys())} as argument to '-p'.")
+            #storing data for all pods
+            else:
+                print(f"No pod argument was entered. Storing logs for pods {list(debugCliData.keys())} in {args.namespace}...")
+                storeLogCaller(taskList+getLogTasks(podList,args.namespace,parser,isVerbose=args.verbose),args.namespace,parser)
+    else:
+        hint = f"The name of the federation that you wish to debug must be provided from {fedList} as argument to '-n' in order to run the script."
+        if args.namespace!=None:
+            fail(f"The fed '{args.namespace}' doesn't exist in this cluster. Please enter the name of the federation from the above choices.",hint)
+        else:
+            fail("No federation argument was entered. Please enter the name of the federation from the above choices.",hint)
+    print(exitMessage)
+
+class GzipBlockReader:
+    #decompresses a gzip file member by member, noting where every member starts so '--build' gets a block table
+    def __init__(self,fileObj):
+        self.fileObj = fileObj
+        self.blocks = []
+        self.input = b''
+        self.fileRead = 0
+        self.raw = 0
+        self.decompressor = None
+
+    def read(self,size=-1):
+        out = bytearray()
+        while size<0 or len(out)<size:
+            if not self.input:
+                self.input = self.fileObj.read(1024*1024)
+                self.fileRead += len(self.input)
+                if not self.input:
+                    break
+            if self.decompressor==None:
+                self.blocks.append([self.raw,self.fileRead-len(self.input)])
+                self.decompressor = zlib.decompressobj(31)
+            data = self.decompressor.decompress(self.input,1024*1024 if size<0 else size-len(out))
+            if self.decompressor.eof:
+                self.input = self.decompressor.unused_data
+                self.decompressor = None
+            else:
+                self.input = self.decompressor.unconsumed_tail
+            self.raw += len(data)
+            out += data
+        return bytes(out)
+
+def openDecompressed(fileObj,compression):
+    if compression=='gz':
+        return gzip.GzipFile(fileobj=fileObj,mode='rb')
+    if compression=='xz':
+        return lzma.LZMAFile(fileObj)
+    if compression=='zst':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(fileObj,read_across_frames=True)
+    return fileObj
+
+class ArchiveReader:
+    #reads ranges of an archive's tar stream, starting at the gzip block before them when the index has a block table
+    def __init__(self,archiveName,index):
+        self.archiveName = archiveName
+        self.compression = index['compression']
+        self.blocks = index['blocks'] or []
+        self.blockStarts = [block[0] for block in self.blocks]
+        self.rawFile = None
+        self.stream = None
+        self.position = 0
+
+    def getStart(self,offset):
+        #[tar offset, file offset] the nearest place before offset that decompression can start from
+        if self.compression=='none':
+            return [offset,offset]
+        if self.blocks:
+            return self.blocks[max(bisect.bisect_right(self.blockStarts,offset)-1,0)]
+        return [0,0]
+
+    def open(self,offset):
+        self.close()
+        start = self.getStart(offset)
+        self.rawFile = open(self.archiveName,'rb')
+        self.rawFile.seek(start[1])
+        self.stream = openDecompressed(self.rawFile,self.compression)
+        self.position = start[0]
+
+    def read(self,offset,length):
+        #a far jump only starts over from a block that begins past what was already read, otherwise reading on is cheaper
+        if self.stream==None or offset<self.position or (offset-self.position>indexSeekDistance and self.getStart(offset)[0]>self.position):
+            self.open(offset)
+        while self.position<offset:
+            skipped = len(self.stream.read(min(offset-self.position,1024*1024)))
+            if not skipped:
+                raise EOFError(f"{self.archiveName} ends before its index says it should.")
+            self.position += skipped
+        data = self.stream.read(length)
+        self.position += len(data)
+        return data
+
+    def close(self):
+        if self.rawFile!=None:
+            self.rawFile.close()
+        self.rawFile = None
+        self.stream = None
+
+def getArchiveCompression(archiveName):
+    for name,(extension,level) in compressionFormats.items():
+        if name!='none' and archiveName.endswith(extension):
+            return name
+    return 'none'
+
+def buildIndex(archiveName):
+    #one pass over an archive collected without --index, multi-member gzip archives still get their block table
+    compression = getArchiveCompression(archiveName)
+    index = ArchiveIndex(f'{archiveName}.idx',compression)
+    with open(archiveName,'rb') as rawFile:
+        stream = GzipBlockReader(rawFile) if compression=='gz' else openDecompressed(rawFile,compression)
+        with tarfile.open(fileobj=stream,mode='r|') as tarFile:
+            for member in tarFile:
+                if not member.isfile() or not index.wants(member.name):
+                    continue
+                indexed = index.startMember(member.name,member.size)
+                memberFile = tarFile.extractfile(member)
+                for data in iter(lambda: memberFile.read(1024*1024),b''):
+                    indexed.feed(data)
+                indexed.finish(member.offset_data)
+    index.save(stream.blocks if compression=='gz' else None)
+
+def getQueryTime(value):
+    match = re.fullmatch(r'(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(\.\d+)?Z?',value)
+    return f'{match.group(1)}T{match.group(2)}' if match else None
+
+def getQueryChunks(index,args):
+    chunks = index['chunks']
+    chunkIds = set(range(len(chunks)))
+    for keyword in args.keyword or []:
+        #indexed tokens narrow the chunks down, any other text is searched for in every chunk that is left
+        if tokenPattern.fullmatch(keyword.encode()):
+            chunkIds &= set(index['tokens'].get(keyword.lower(),[]))
+    selected = []
+    for chunkId in sorted(chunkIds):
+        fileId,position,length,first,last,levels = chunks[chunkId]
+        if (args.start or args.end) and first==None:
+            continue
+        if args.start and last<args.start or args.end and first>args.end:
+            continue
+        if args.level and args.level not in levels:
+            continue
+        selected.append(chunks[chunkId])
+    return selected
+
+def printQueryLines(archiveName,index,chunks,args):
+    files = index['files']
+    keywords = [keyword.lower().encode() for keyword in args.keyword or []]
+    level = re.compile(rb'\b'+re.escape(args.level.encode())+rb'\b') if args.level else None
+    reader = ArchiveReader(archiveName,index)
+    matches = 0
+    try:
+        for fileId,position,length,first,last,levels in sorted(chunks,key=lambda chunk: files[chunk[0]]['offset']+chunk[1]):
+            prefix = files[fileId]['name'].encode()+b': '
+            for line in reader.read(files[fileId]['offset']+position,length).splitlines():
+                if args.start or args.end:
+                    timestamp = timestampPattern.search(line)
+                    if timestamp==None:
+                        continue
+                    timestamp = timestamp.group().decode().replace(' ','T')
+                    if args.start and timestamp<args.start or args.end and timestamp>args.end:
+                        continue
+                if level!=None and not level.search(line):
+                    continue
+                if keywords and not all(keyword in line.lower() for keyword in keywords):
+                    continue
+                sys.stdout.buffer.write(prefix+line+b'\n')
+                matches += 1
+    finally:
+        reader.close()
+    sys.stdout.flush()
+    return matches
+
+def printQueryFiles(index,chunks):
+    files = index['files']
+    for fileId in sorted(set(chunk[0] for chunk in chunks)):
+        record = files[fileId]
+        levels = ' '.join(f'{level}={count}' for level,count in sorted(record['levels'].items()))
+        print(f"{record['name']}  {record['first']} .. {record['last']}  lines={record['lines']}  {levels}")
+
+def queryMain(argv):
+    parser = LogParser(prog='kubectl logCollect query',formatter_class=argparse.RawDescriptionHelpFormatter,
+    description='''\
+Search an archive written with --index without unpacking it.
+
+Only the chunks whose time range, levels and UE ids/error codes can match are decompressed, starting from the
+closest gzip block of the archive.
+
+Examples:
+    #Lines of a UE in a time window:
+    kubectl logCollect query fed-amf-Logs_1700000000.tar.gz -k imsi-001010000012345 --from 2024-01-31T10:00:00Z --to 2024-01-31T10:05:00Z
+
+    #Files holding ERROR lines with a cause code, with their time ranges and level counts:
+    kubectl logCollect query fed-amf-Logs_1700000000.tar.gz -k cause=0x1f --level ERROR --files
+
+    #Index an archive that was collected without --index:
+    kubectl logCollect query fed-amf-Logs_1700000000.tar.gz --build
+        ''')
+    parser.add_argument("archive",help="archive written by kubectl logCollect")
+    parser.add_argument("-k","--keyword",action='append',help="UE id, error code or text the lines must contain, can be repeated")
+    parser.add_argument("--level",choices=['TRACE','DEBUG','INFO','NOTICE','WARN','WARNING','ERROR','CRITICAL','FATAL'],help="only lines of this log level")
+    parser.add_argument("--from",dest='start',metavar='TIME',help="only lines logged at or after this time, like 2024-01-31T10:00:00Z")
+    parser.add_argument("--to",dest='end',metavar='TIME',help="only lines logged at or before this time")
+    parser.add_argument("--files",action='store_true',help="list the matching files with their time ranges and level counts instead of lines")
+    parser.add_argument("--build",action='store_true',help="index an archive that was collected without --index")
+    args = parser.parse_args(argv)
+    for name in ('start','end'):
+        if getattr(args,name)!=None:
+            if getQueryTime(getattr(args,name))==None:
+                print(f"\u001b[31mError: '{getattr(args,name)}' is not a time like 2024-01-31T10:00:00Z.\u001b[0m")
+                exit()
+            setattr(args,name,getQueryTime(getattr(args,name)))
+    if not os.path.exists(args.archive):
+        print(f"\u001b[31mError: The archive '{args.archive}' doesn't exist.\u001b[0m")
+        exit()
+    if args.build:
+        print(f"Indexing {args.archive}...",file=sys.stderr)
+        try:
+            buildIndex(args.archive)
+        except (OSError,EOFError,tarfile.TarError,zlib.error,lzma.LZMAError) as err:
+            print(f"\u001b[31mError: Unable to index {args.archive}: {err}\u001b[0m")
+            exit()
+    try:
+        with gzip.open(f'{args.archive}.idx','rt') as indexFile:
+            index = json.load(indexFile)
+    except FileNotFoundError:
+        print(f"\u001b[31mError: {args.archive} has no index, collect it with --index or run 'kubectl logCollect query {args.archive} --build'.\u001b[0m")
+        exit()
+    if args.build and not (args.keyword or args.level or args.start or args.end or args.files):
+        print(f"\u001b[32mIndexed {len(index['files'])} files of {args.archive}.\u001b[0m")
+        return
+    chunks = getQueryChunks(index,args)
+    try:
+        if args.files:
+            printQueryFiles(index,chunks)
+            #flushed here, so that a reader that is gone shows up as the BrokenPipeError below instead of at exit
+            sys.stdout.flush()
+            return
+        matches = printQueryLines(args.archive,index,chunks,args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        #the reader of the output (head, less) is gone, so the rest isn't wanted
+        os.dup2(os.open(os.devnull,os.O_WRONLY),sys.stdout.fileno())
+        return
+    except (OSError,EOFError,zlib.error,lzma.LZMAError) as err:
+        print(f"\u001b[31mError: Unable to read {args.archive}: {err}\u001b[0m")
+        exit()
+    print(f"{matches} matching lines from {len(chunks)} of {len(index['chunks'])} chunks.",file=sys.stderr)
+
+def restoreMain(argv):
+    parser = LogParser(prog='kubectl logCollect restore',formatter_class=argparse.RawDescriptionHelpFormatter,
+    description='''\
+Unpack an archive collected with --dedup, putting back the files it only references from the local store.
+
+Examples:
+    kubectl logCollect restore fed-amf-Logs_1700000000.tar.gz
+    kubectl logCollect restore fed-amf-Logs_1700000000.tar.gz -o /tmp/fed-amf-logs
+        ''')
+    parser.add_argument("archive",help="archive written by kubectl logCollect")
+    parser.add_argument("-o","--output",default='.',metavar='DIR',help="directory to unpack into (default: the current one)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.archive):
+        print(f"\u001b[31mError: The archive '{args.archive}' doesn't exist.\u001b[0m")
+        exit()
+    dedupFiles = []
+    try:
+        with open(args.archive,'rb') as rawFile:
+            with tarfile.open(fileobj=openDecompressed(rawFile,getArchiveCompression(args.archive)),mode='r|') as tarFile:
+                for member in tarFile:
+                    tarFile.extract(member,args.output,**({'filter':'data'} if hasattr(tarfile,'data_filter') else {}))
+                    if os.path.basename(member.name)=='dedup.json':
+                        dedupFiles.append(os.path.join(args.output,member.name))
+    except (OSError,EOFError,tarfile.TarError,zlib.error,lzma.LZMAError) as err:
+        print(f"\u001b[31mError: Unable to unpack {args.archive}: {err}\u001b[0m")
+        exit()
+    missing = []
+    for dedupFile in dedupFiles:
+        with open(dedupFile) as infoFile:
+            info = json.load(infoFile)
+        for fileName,blob in info['files'].items():
+            #the store of the run that collected the archive, or the one of this user
+            for store in (info['store'],f'{stateDir}/blobs'):
+                if os.path.exists(f"{store}/{blob['sha256'][:2]}/{blob['sha256']}"):
+                    shutil.copyfile(f"{store}/{blob['sha256'][:2]}/{blob['sha256']}",os.path.join(os.path.dirname(dedupFile),os.path.basename(fileName)))
+                    break
+            else:
+                missing.append(fileName)
+    for fileName in missing:
+        print(f"\u001b[31m{fileName} is not in the store anymore, it was stored in full by an earlier archive of the same fed.\u001b[0m")
+    print(f"\u001b[32mRestored {args.archive} into {args.output}.\u001b[0m")
+
+def main():
+    #defining parser
+    parser = LogParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+    description='''\
+Automated retrieval and storage of log data to improve debuggability.
+
+This tool helps collect logs from multiple pods/containers across different federations.
+At the moment, this tool only provides support for debugCli logs for amf-cc and amf-n2 from the federation fed-amf,
+other pod prefixes, their endpoints and other federations can be listed in ~/.logCollect/config.json.
+
+The name of the federation that you wish to debug must be provided as argument to '-n' in order to run the script.
+Additionally, if you wish to debug a specific pod in a fed, please specify the pod as argument to '-p'.
+
+This tool also supports collecting debug logs from all pods in the fed, including deployment files. Use the argument '-d' to specify the pod and '-c' if you wish to collect
+from a specific container in the pod.
+
+Examples:
+    #Collect and store logs of all pods in fed-amf:
+    kubectl logCollect -n fed-amf
+    
+    #Collect and store logs of a specific pod (amf-cc here) in fed-amf:
+    kubectl logCollect -n fed-amf -p amf-cc
+
+    #Additionally, collect and store rest api logs + debug logs of a pod in fed-amf:
+    kubectl logCollect -n fed-amf -d amf-cc
+                        (or)
+    kubectl logCollect -n fed-amf -p amf-cc -d amf-cc
+    
+    #Collect and store debugCli logs + debug logs of a specific container in a pod:
+    kubectl logCollect -n fed-amf -d amf-n2 -c infra
+                        (or)
+    kubectl logCollect -n fed-amf -p amf-cc -d amf-n2 -c infra                
+
+    #Collect and store debugCli logs + debug logs of all pods in fed-amf:
+    kubectl logCollect -n fed-amf -d all
+                        (or)
+    kubectl logCollect -n fed-amf -p amf-cc -d all
+
+    #Collect from up to 8 instances/containers at the same time:
+    kubectl logCollect -n fed-amf -d all --parallel 8
+
+    #Compress the archive on 4 cores, or with zstd/xz instead of gzip:
+    kubectl logCollect -n fed-amf -d all --compress-threads 4
+    kubectl logCollect -n fed-amf -d all --compression zst --level 10
+
+    #Index the archive while writing it, then find a UE's ERROR lines in a time window without unpacking it:
+    kubectl logCollect -n fed-amf -d all --index
+    kubectl logCollect query fed-amf-Logs_1700000000.tar.gz -k imsi-001010000012345 --level ERROR --from 2024-01-31T10:00:00Z
+
+    #Store only the last 10 minutes of debug logs, or only what was logged since the previous run:
+    kubectl logCollect -n fed-amf -d all --since 10m
+    kubectl logCollect -n fed-amf -d all --incremental
+
+    #Store only ERROR lines (and above) of one UE logged in a 5 minute window:
+    kubectl logCollect -n fed-amf -d all --log-level ERROR --grep imsi-001010000012345 --window 2024-01-31T10:00:00Z,2024-01-31T10:05:00Z
+
+    #Keep following the debug logs of all amf-cc pods into 5 minute segments until Ctrl-C:
+    kubectl logCollect -n fed-amf -d amf-cc --follow --segment-seconds 300
+
+    #Fetch the debugCli logs of each instance in a single exec session:
+    kubectl logCollect -n fed-amf -p amf-cc --batched
+
+    #Collect from two feds in two clusters at the same time, into one archive laid out as context/fed:
+    kubectl logCollect -n fed-amf,fed-amf-2 --context east,west -d all --max-targets 4
+
+    #Collect from every target listed in ~/.logCollect/config.json:
+    kubectl logCollect --all-targets -d all
+
+    #Get what can be collected in 30 seconds during an outage, restarting and failing containers first:
+    kubectl logCollect -n fed-amf --budget 30 --parallel 8
+
+    #Retry failed pods 3 times, then archive what was collected and collect only the failed ones again later:
+    kubectl logCollect -n fed-amf -d all --retries 3 --retry-backoff 2
+    kubectl logCollect --rerun fed-amf-Logs_1700000000.tar.gz.failed.json
+
+    #Talk to the API server over reused connections instead of starting kubectl for every call:
+    kubectl logCollect -n fed-amf -d all --backend api
+
+    #Store deployment YAMLs, the pods table and common configs only when they changed since an earlier run,
+    #then unpack such an archive with the unchanged files put back:
+    kubectl logCollect -n fed-amf -d all --dedup
+    kubectl logCollect restore fed-amf-Logs_1700000000.tar.gz
+
+    #Stay within 128 MB of memory and keep only the last 500 MB of every log file:
+    kubectl logCollect -n fed-amf -d all --memory-limit 128 --max-file-size 500
+
+    #Print what a collection would store and about how big it gets, without collecting anything:
+    kubectl logCollect -n fed-amf -d all --dry-run
+
+    #See where a slow collection spends its time (runReport.json in the archive has every span):
+    kubectl logCollect -n fed-amf -d all --report-top 10 --trace-file trace.json
+
+    #Write logs straight into the archive without staging them in /tmp:
+    kubectl logCollect -n fed-amf -d all --stream
+
+    #To store only debug logs w/o debugCli logs, add the --onlydebug flag:
+    kubectl logCollect -n fed-amf -d all --onlydebug
+                        (or)
+    kubectl logCollect -n fed-amf -d amf-cc --onlydebug
+    
+    #Display help message:
+    kubectl logCollect -h
+        ''')
+    # specifying the command line arguments that the program is willing to accept
+    parser.add_argument(
+        "-n", "--namespace", help="name of the federation, several separated by commas are collected at the same time")
+    parser.add_argument("-p", "--pod", help="name of the pod")
+    parser.add_argument("-d", "--debuglogs",help="option to print debug logs for a pod")
+    parser.add_argument("-c", "--container",help="name of the container you wish to print debug logs for")
+    parser.add_argument("-v","--verbose", action='store_true', help="increase output verbosity")
+    parser.add_argument("--onlydebug",action='store_true', help="store only debug logs w/o debugCli logs")
+    parser.add_argument("--context",help="kubeconfig context to collect from, several contexts separated by commas are collected at the same time")
+    parser.add_argument("--config",metavar='FILE',help="JSON file with the debugCli prefixes and their endpoints, the supported feds and the targets of --all-targets (default: ~/.logCollect/config.json)")
+    parser.add_argument("--all-targets",action='store_true',help="collect from every context and fed listed in the 'targets' of the config file")
+    parser.add_argument("--max-targets",type=int,default=4,metavar='N',help="targets collected at the same time when collecting from several feds/contexts (default: 4)")
+    parser.add_argument("--fanout-child",metavar='ARCHIVE',help=argparse.SUPPRESS)
+    parser.add_argument("--budget",type=int,metavar='SECONDS',help="quick triage: store pods, deployments and the last lines of every container, failing ones first, then deepen until the time runs out")
+    parser.add_argument("--triage-lines",type=int,default=200,metavar='N',help="lines of every container the first pass of --budget stores (default: 200)")
+    parser.add_argument("--retries",type=int,default=2,metavar='N',help="times a failed instance/container is collected again before it is given up (default: 2)")
+    parser.add_argument("--retry-backoff",type=float,default=1,metavar='SECONDS',help="wait before the first retry, doubled for every further one (default: 1)")
+    parser.add_argument("--breaker-threshold",type=int,default=3,metavar='N',help="skip the remaining tasks of a pod after N of its tasks failed, 0 never skips (default: 3)")
+    parser.add_argument("--fail-fast",action='store_true',help="discard the collection on the first task that fails for good instead of archiving the others")
+    parser.add_argument("--rerun",metavar='FILE',help="collect only the tasks listed in the .failed.json written next to an archive of an earlier run")
+    parser.add_argument("--backend",choices=['kubectl','api'],default='kubectl',help="run kubectl for every call, or talk to the API server over pooled connections (default: kubectl)")
+    parser.add_argument("--timeout",type=int,default=300,metavar='SECONDS',help="seconds a kubectl call may run, or stay silent while transferring logs, before it is killed (default: 300)")
+    parser.add_argument("--max-procs",type=int,default=16,metavar='N',help="kubectl processes allowed to run at the same time (default: 16)")
+    parser.add_argument("--batched",action='store_true',help="request, copy and delete the debugCli logs of an instance in one exec session")
+    parser.add_argument("--stream",action='store_true',help="write logs straight into the archive instead of staging them in /tmp, a task's members wait in its share of --memory-limit and beyond that in $TMPDIR until it succeeded")
+    parser.add_argument("--compression",choices=list(compressionFormats.keys()),default='gz',help="compression of the output archive (default: gz)")
+    parser.add_argument("--level",type=int,help="compression level, 0-9 for gz/xz and 1-22 for zst")
+    parser.add_argument("--compress-threads",type=int,default=1,metavar='N',help="threads used to compress the archive, gz then writes pigz-style blocks")
+    parser.add_argument("--index",action='store_true',help="write an index next to the archive so 'kubectl logCollect query' can search it without unpacking")
+    parser.add_argument("--since",metavar='DURATION',help="only store debug logs newer than a relative duration like 10m or 1h")
+    parser.add_argument("--since-time",metavar='TIME',help="only store debug logs written after an RFC3339 time like 2024-01-31T10:00:00Z")
+    parser.add_argument("--incremental",action='store_true',help="only store debug logs written since the previous run, into an archive that refers to it")
+    parser.add_argument("--grep",metavar='REGEX',help="only store log lines matching this POSIX extended regular expression, debugCli files are filtered inside the pod")
+    parser.add_argument("--log-level",choices=list(logLevelRanks.keys()),help="only store log lines of this level or above")
+    parser.add_argument("--window",metavar='START,END',help="only store log lines logged between two RFC3339 times, either may be left out")
+    parser.add_argument("--follow",action='store_true',help="keep following the debug logs of the pods given to '-d' into rotating segment files, one stream per container and at most --max-procs minus one at a time")
+    parser.add_argument("--segment-seconds",type=int,default=300,metavar='SECONDS',help="start a new --follow segment after this many seconds (default: 300)")
+    parser.add_argument("--segment-size",type=int,default=100,metavar='MB',help="start a new --follow segment after this many MB of logs (default: 100)")
+    parser.add_argument("--topology-ttl",type=int,default=60,metavar='SECONDS',help="trust the namespaces, pods and deployments an earlier run listed this recently to accept -n/-d and plan --dry-run without asking the cluster, 0 always asks it (default: 60)")
+    parser.add_argument("--dry-run",action='store_true',help="list the files and tasks of the collection with their exact or estimated size, without collecting anything")
+    parser.add_argument("--port-cache-ttl",type=int,default=0,metavar='SECONDS',help="keep container ports in ~/.logCollect/ports/ for this many seconds so repeated runs skip the lookup")
+    parser.add_argument("--dedup",action='store_true',help="only reference deployment YAMLs, the pods table and common debugCli logs unchanged since earlier runs, see 'kubectl logCollect restore'")
+    parser.add_argument("--memory-limit",type=int,default=256,metavar='MB',help="memory the buffers of a run may use, larger members are spooled to temporary files (default: 256)")
+    parser.add_argument("--max-file-size",type=int,default=0,metavar='MB',help="store only the last MB of every log file that is bigger, 0 stores everything")
+    parser.add_argument("--report-top",type=int,default=5,metavar='N',help="print the N slowest phases and kubectl calls at the end, 0 prints none (default: 5)")
+    parser.add_argument("--trace-file",metavar='FILE',help="write every phase and kubectl call as a Chrome trace, viewable in chrome://tracing or ui.perfetto.dev")
+    parser.add_argument("--parallel",type=int,default=1,metavar='N',help="number of instances/containers to collect from at the same time")
+    # parse_args() method returns actual argument data from the command line
+    args = parser.parse_args()
+    
+    print("Reading arguments...")
+    readArguments(args,parser)
+    finishRun()
+
+
+if __name__ == "__main__":
+    #queries and restores only read archives, so they don't take the lock of a collection
+    if sys.argv[1:2]==['query']:
+        queryMain(sys.argv[2:])
+    elif sys.argv[1:2]==['restore']:
+        restoreMain(sys.argv[2:])
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+#Collection pipeline shared by kubectl-logCollect.py and logTool.py: collection tasks are declared as data, run
+#on a pool of threads and write their output into the archive while they produce it, so nothing is staged in a
+#directory and read back by hand.
+#
+#   tasks = [CommandTask('log-data-one/log-one.txt',['ls'])]
+#   with ArchiveWriter.open('logs.tar.gz') as archive:
+#       returnCodes = runPipeline(archive,tasks,parallelism=4)
+
+import io
+import sys
+import time
+import shutil
+import tarfile
+import tempfile
+import threading
+import subprocess
+import collections
+from collections import namedtuple
+import concurrent.futures
+
+#member of the archive and the command whose stdout is stored in it
+CommandTask = namedtuple('CommandTask',['member','argv'])
+
+def readChunks(fileObj,chunkSize):
+    #the stream as (pieces,last) chunks of at most chunkSize bytes, cut after a line end where there is one so every
+    #chunk reads as whole lines; a chunk is the list of reads it is made of and is never copied into one buffer
+    pieces = []
+    held = 0
+    eof = False
+    while True:
+        while not eof and held<=chunkSize:
+            data = fileObj.read(1024*1024)
+            eof = not data
+            pieces.append(data)
+            held += len(data)
+        if eof and held<=chunkSize:
+            yield pieces,True
+            return
+        #the read holding byte chunkSize, and where the chunk ends: after the last line end before it, else right there
+        index,start = 0,0
+        while start+len(pieces[index])<chunkSize:
+            start += len(pieces[index])
+            index += 1
+        end = chunkSize-start
+        cut = None
+        for back in range(index,-1,-1):
+            cut = pieces[back].rfind(b'\n',0,end if back==index else len(pieces[back]))+1
+            if cut:
+                index = back
+                break
+        if not cut:
+            cut = end
+        chunk = pieces[:index]+[pieces[index][:cut]]
+        pieces = [pieces[index][cut:]]+pieces[index+1:]
+        held = sum(len(piece) for piece in pieces)
+        yield chunk,False
+        del chunk
+
+class ChunkReader:
+    #the pieces of a chunk read like one file, each dropped once it has been read
+    def __init__(self,pieces):
+        self.pieces = collections.deque(memoryview(piece) for piece in pieces)
+
+    def read(self,size=-1):
+        data = bytearray()
+        while self.pieces and (size==None or size<0 or len(data)<size):
+            piece = self.pieces.popleft()
+            if size!=None and size>=0 and len(data)+len(piece)>size:
+                self.pieces.appendleft(piece[size-len(data):])
+                piece = piece[:size-len(data)]
+            data += piece
+        return bytes(data)
+
+def runConcurrently(function,items,parallelism):
+    #results in the order of the items, computed one by one in the calling thread when parallelism is 1
+    if parallelism<=1:
+        return [function(item) for item in items]
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=parallelism)
+    try:
+        return list(pool.map(function,items))
+    finally:
+        pool.shutdown(wait=False,cancel_futures=True)
+
+class ArchiveWriter:
+    #tar archive that several threads write members into as they are produced
+    def __init__(self,tarFile,rootName=None,spoolSize=64*1024*1024):
+        self.tarFile = tarFile
+        self.rootName = rootName
+        self.spoolSize = spoolSize
+        self.lock = threading.Lock()
+        if rootName!=None:
+            rootInfo = tarfile.TarInfo(rootName)
+            rootInfo.type = tarfile.DIRTYPE
+            rootInfo.mode = 0o755
+            rootInfo.mtime = time.time()
+            self.tarFile.addfile(rootInfo)
+
+    @classmethod
+    def open(cls,archiveName,rootName=None,mode='w:gz'):
+        return cls(tarfile.open(archiveName,mode),rootName)
+
+    def memberInfo(self,fileName,size):
+        tarInfo = tarfile.TarInfo(fileName if self.rootName==None else f'{self.rootName}/{fileName}')
+        tarInfo.size = size
+        tarInfo.mode = 0o644
+        tarInfo.mtime = time.time()
+        return tarInfo
+
+    def addBytes(self,fileName,data):
+        with self.lock:
+            self.tarFile.addfile(self.memberInfo(fileName,len(data)),io.BytesIO(data))
+
+    def addMember(self,fileName,fileObj,size=None):
+        #a member of known size is copied straight from its source while nobody else is writing, otherwise it is
+        #spooled first so that the archive lock is only held for the copy; one of unknown size is added in chunks
+        if size==None:
+            return self.addChunks(fileName,fileObj)
+        if self.lock.acquire(blocking=False):
+            try:
+                self.tarFile.addfile(self.memberInfo(fileName,size),fileObj)
+            finally:
+                self.lock.release()
+            return
+        with tempfile.SpooledTemporaryFile(max_size=self.spoolSize) as spool:
+            shutil.copyfileobj(fileObj,spool)
+            size = spool.tell()
+            spool.seek(0)
+            with self.lock:
+                self.tarFile.addfile(self.memberInfo(fileName,size),spool)
+
+    def addChunks(self,fileName,fileObj,parts=None,addWhole=None):
+        #a stream of unknown size never goes through a temporary file: when it fits in one chunk of spoolSize it is
+        #added whole by addWhole, otherwise its chunks become fileName.part0000, .part0001... (cat joins them again),
+        #each added as soon as it is read and listed in parts; returns the size of the stream
+        size = 0
+        for number,(pieces,last) in enumerate(readChunks(fileObj,self.spoolSize)):
+            chunkSize = sum(len(piece) for piece in pieces)
+            size += chunkSize
+            if number==0 and last:
+                (addWhole or self.addBytes)(fileName,b''.join(pieces))
+                break
+            if parts!=None:
+                parts.append(f'{fileName}.part{number:04d}')
+            with self.lock:
+                self.tarFile.addfile(self.memberInfo(f'{fileName}.part{number:04d}',chunkSize),ChunkReader(pieces))
+            #dropped before the next chunk is read, so no more than one is held
+            del pieces
+        return size
+
+    def commit(self,pending):
+        #adds (fileName,spool,size) members spooled earlier in one go, so that they end up in the archive together
+        try:
+            with self.lock:
+                for fileName,spool,size in pending:
+                    spool.seek(0)
+                    self.tarFile.addfile(self.memberInfo(fileName,size),spool)
+        finally:
+            for fileName,spool,size in pending:
+                spool.close()
+
+    def close(self):
+        self.tarFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*excInfo):
+        self.close()
+
+def storeCommand(archive,task):
+    #the command's stdout goes into its member as it is written, the return code tells whether it succeeded
+    try:
+        proc = subprocess.Popen(task.argv,stdout=subprocess.PIPE)
+    except OSError as err:
+        #a command that can't be started fails like the shell reports it, instead of ending the whole pipeline
+        print(f"{task.argv[0]}: {err.strerror}",file=sys.stderr)
+        return 127
+    with proc:
+        archive.addMember(task.member,proc.stdout)
+    return proc.returncode
+
+def runPipeline(archive,tasks,parallelism):
+    return runConcurrently(lambda task: storeCommand(archive,task),tasks,parallelism)
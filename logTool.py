@@ -1,35 +1,30 @@
 #!/usr/bin/env python3
 
 import argparse
-import subprocess
 import os
 from pathlib import Path
-import tarfile
 
+import logPipeline
 
-def archive_items():
-    archive_name = 'logs.tar.gz'
-    # storing as .tar.gz file, gz is the compression algorithm
-    with tarfile.open(archive_name, 'w:gz') as tf:
-        # manual addition, can optimize
-        tf.add('log-data-one'), tf.add('log-data-two')
-    print('Archived log files successfully.')
+# member of logs.tar.gz and the command whose output is stored in it, a new command only needs a line here
+collection_tasks = [
+    logPipeline.CommandTask('log-data-one/log-one.txt', ['ls']),
+    logPipeline.CommandTask('log-data-two/log-two.txt', ['ls', '-l']),
+]
 
 
 def store_data():
-    # create directories
-    os.makedirs("log-data-one")
-    os.makedirs("log-data-two")
-    print("created dirs.")
-    if os.path.exists("log-data-one") and os.path.exists("log-data-two"):
-        # write output of different commands to separate files
-        with open('log-data-one/log-one.txt', 'w') as f_one:
-            processOne = subprocess.run(['ls'], stdout=f_one, text=True)
-        with open('log-data-two/log-two.txt', 'w') as f_two:
-            processTwo = subprocess.run(['ls', '-l'], stdout=f_two, text=True)
-        if processOne.returncode == 0 and processTwo.returncode == 0:
-            print('Data stored successfully.')
-            archive_items()
+    archive_name = 'logs.tar.gz'
+    # the commands run together and stream their output straight into the .tar.gz, gz is the compression algorithm
+    with logPipeline.ArchiveWriter.open(archive_name) as archive:
+        return_codes = logPipeline.runPipeline(archive, collection_tasks, len(collection_tasks))
+    if all(return_code == 0 for return_code in return_codes):
+        print('Data stored successfully.')
+        print('Archived log files successfully.')
+    else:
+        # an archive with the output of a failed command is not kept
+        os.remove(archive_name)
+        print('Unable to store data.')
 
 
 def read_args(args):
@@ -0,0 +1,202 @@
+#Runs kubectl-logCollect against the synthetic cluster of benchmarks/fakeKubectl.py.
+#
+#   python3 -m pytest -q tests
+
+import os
+import sys
+import json
+import time
+import gzip
+import signal
+import shutil
+import tarfile
+import subprocess
+import importlib.util
+
+import pytest
+
+packageDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+benchmarkDir = os.path.join(packageDir,'benchmarks')
+
+def loadLogCollect():
+    sys.path.insert(0,packageDir)
+    spec = importlib.util.spec_from_file_location('logCollect',os.path.join(packageDir,'kubectl-logCollect.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def writeCluster(workDir,replicas=1,logKb=4):
+    cluster = {
+        'namespaces':['default','kube-system','fed-amf'],
+        'deployments':{'amf-cc':['amf-cc','infra'],'amf-n2':['amf-n2','infra','sctp']},
+        'replicas':replicas,
+        'logKb':{'default':logKb},
+        'debugCliKb':1,
+        'latencyMs':{},
+        'stateDir':os.path.join(workDir,'cluster'),
+        'callLog':os.path.join(workDir,'calls.jsonl'),
+    }
+    with open(os.path.join(workDir,'cluster.json'),'w') as clusterFile:
+        json.dump(cluster,clusterFile)
+    return cluster
+
+def runLogCollect(workDir,*args):
+    #HOME keeps ~/.logCollect of every test apart
+    env = dict(os.environ,HOME=str(workDir),LOGCOLLECT_KUBECTL=os.path.join(benchmarkDir,'fakeKubectl.py'),
+        LOGCOLLECT_FAKE_CLUSTER=os.path.join(workDir,'cluster.json'))
+    return subprocess.run([sys.executable,os.path.join(packageDir,'kubectl-logCollect.py'),*args],cwd=workDir,env=env,
+        stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,timeout=120).stdout.decode()
+
+def test_dryRunKeepsStagingDirectory(tmp_path):
+    #a dry run that stops at a bad argument leaves the staging directory of a collection of the same target alone
+    writeCluster(tmp_path)
+    context = f'dryrun-{os.getpid()}'
+    stagingDir = f'/tmp/{context}_fed-amf'
+    os.makedirs(stagingDir,exist_ok=True)
+    open(os.path.join(stagingDir,'amf-cc.log'),'w').close()
+    try:
+        for args in (['-d','amf-cc','-c','bogus'],['--onlydebug']):
+            output = runLogCollect(tmp_path,'--dry-run','-n','fed-amf','--context',context,*args)
+            assert 'Error' in output
+            assert os.path.exists(os.path.join(stagingDir,'amf-cc.log'))
+    finally:
+        shutil.rmtree(stagingDir,ignore_errors=True)
+
+def test_singleBlockIndexReadsForward(tmp_path,monkeypatch):
+    #an index built for a single-stream .tar.gz has one block, so jumping ahead reads on instead of starting over
+    logCollect = loadLogCollect()
+    monkeypatch.setattr(logCollect,'indexSeekDistance',64*1024)
+    archiveName = str(tmp_path/'fed-amf-Logs_1.tar.gz')
+    with tarfile.open(archiveName,'w:gz') as archive:
+        for i in range(6):
+            logPath = tmp_path/f'pod-{i}.log'
+            logPath.write_bytes(b''.join(b'2024-01-31T10:00:%02d.000Z INFO pod-%d line %06d\n' % (n%60,i,n) for n in range(8000)))
+            archive.add(logPath,f'fed-amf/pod-{i}.log')
+    logCollect.buildIndex(archiveName)
+    with gzip.open(f'{archiveName}.idx','rt') as indexFile:
+        index = json.load(indexFile)
+    assert len(index['blocks'])==1
+    reader = logCollect.ArchiveReader(archiveName,index)
+    opens = []
+    monkeypatch.setattr(reader,'open',lambda offset,open=reader.open: opens.append(offset) or open(offset))
+    try:
+        for record in index['files'][::2]:
+            assert reader.read(record['offset'],40).startswith(b'2024-01-31T10:00:00.000Z INFO '+record['name'][8:13].encode())
+    finally:
+        reader.close()
+    assert len(opens)==1
+
+class ReplayBackend:
+    #a log stream per attach, each replaying what 'kubectl logs --since-time' would send from the start of that second
+    def __init__(self,attaches,stopEvent):
+        self.attaches = attaches
+        self.stopEvent = stopEvent
+        self.options = []
+
+    def openLogs(self,fed,instance,container,options):
+        self.options.append(options)
+        if not self.attaches:
+            self.stopEvent.set()
+        return ReplayStream(self.attaches.pop(0) if self.attaches else b'')
+
+class ReplayStream:
+    def __init__(self,data):
+        self.data = data
+
+    def read(self,size=-1):
+        data,self.data = self.data[:size],self.data[size:]
+        return data
+
+    def interrupt(self):
+        pass
+
+    def close(self,kill=False):
+        pass
+
+def test_followSkipsReplayedLines(tmp_path,monkeypatch):
+    #lines of the second the stream is attached again at are only written when they come after the last one written
+    logCollect = loadLogCollect()
+    attaches = [b'2024-01-31T10:00:00Z a\n2024-01-31T10:00:01Z b\n2024-01-31T10:00:01Z c\n',
+        b'2024-01-31T10:00:01Z b\n2024-01-31T10:00:01Z c\n2024-01-31T10:00:01Z d\n2024-01-31T10:00:02Z e\n']
+    written = []
+    segments = type('Segments',(),{'write':lambda self,data: written.append(data)})()
+
+    async def follow():
+        stopEvent = logCollect.asyncio.Event()
+        backend = ReplayBackend(attaches,stopEvent)
+        monkeypatch.setattr(logCollect,'clusterBackend',backend)
+        with logCollect.concurrent.futures.ThreadPoolExecutor(1) as executor:
+            await logCollect.followContainer('fed-amf','amf-cc-0','amf-cc',segments,stopEvent,logCollect.asyncio.Semaphore(1),executor)
+        return backend.options
+
+    options = logCollect.asyncio.run(follow())
+    assert options[1][-1]=='--since-time=2024-01-31T10:00:01Z'
+    lines = b''.join(written).decode().splitlines()
+    assert [line.rsplit(' ',1)[1] for line in lines]==['a','b','c','d','e']
+
+@pytest.mark.parametrize('backend',['kubectl','api'])
+def test_followReattachesWithinMaxProcs(tmp_path,backend):
+    #every stream ends after a second, so the container waiting for a free process gets its turn as well
+    cluster = writeCluster(tmp_path)
+    cluster['followSeconds'] = 1
+    with open(tmp_path/'cluster.json','w') as clusterFile:
+        json.dump(cluster,clusterFile)
+    env = dict(os.environ,HOME=str(tmp_path),LOGCOLLECT_KUBECTL=os.path.join(benchmarkDir,'fakeKubectl.py'),
+        LOGCOLLECT_FAKE_CLUSTER=str(tmp_path/'cluster.json'))
+    server = None
+    if backend=='api':
+        server = subprocess.Popen([sys.executable,os.path.join(benchmarkDir,'fakeApiServer.py'),'--port','0'],env=env,stdout=subprocess.PIPE)
+        env['LOGCOLLECT_FAKE_API'] = server.stdout.readline().decode().strip()
+    try:
+        proc = subprocess.Popen([sys.executable,os.path.join(packageDir,'kubectl-logCollect.py'),'-n','fed-amf','-d','amf-n2','--follow',
+            '--since-time','2026-01-01T00:00:00Z','--max-procs','3','--compression','none','--backend',backend],cwd=tmp_path,env=env,
+            stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+        time.sleep(6)
+        proc.send_signal(signal.SIGINT)
+        output = proc.communicate(timeout=30)[0].decode()
+    finally:
+        if server!=None:
+            server.kill()
+            server.wait()
+    assert 'Following 2 of 3 containers' in output
+    segments = b''.join((tmp_path/name).read_bytes() for name in sorted(os.listdir(tmp_path)) if name.startswith('fed-amf-Follow_'))
+    lines = segments.decode().splitlines()
+    for container in cluster['deployments']['amf-n2']:
+        with open(os.path.join(cluster['stateDir'],'logs',f'amf-n2-5d9f7c-00000-{container}-4.log')) as logFile:
+            expected = [f'amf-n2-5d9f7c-00000/{container} {line[:19]}.000000000Z {line}' for line in logFile.read().splitlines()]
+        assert [line for line in lines if line.startswith(f'amf-n2-5d9f7c-00000/{container} ')]==expected
+    with open(tmp_path/'calls.jsonl') as callLog:
+        calls = [json.loads(line) for line in callLog]
+    assert sum('--follow' in call for call in calls)>3
+
+def test_budgetChecksContainer(tmp_path):
+    #a '-c' the deployment doesn't have stops a --budget run before anything is collected, as it does without --budget
+    writeCluster(tmp_path)
+    for args in (['-d','amf-cc','-c','bogus'],['-c','infra']):
+        output = runLogCollect(tmp_path,'-n','fed-amf','--budget','20',*args)
+        assert 'Error' in output
+        assert not [name for name in os.listdir(tmp_path) if name.startswith('fed-amf-Logs_')]
+    with open(tmp_path/'calls.jsonl') as callLog:
+        assert not [call for call in map(json.loads,callLog) if call[0]=='logs']
+
+def test_budgetReportsUnfinishedTasksApart(tmp_path):
+    #tasks the --budget cut off or never started are listed for --rerun, but aren't reported as failed
+    cluster = writeCluster(tmp_path)
+    cluster['latencyMs'] = {'logs':3000}
+    with open(tmp_path/'cluster.json','w') as clusterFile:
+        json.dump(cluster,clusterFile)
+    output = runLogCollect(tmp_path,'-n','fed-amf','--budget','2','--parallel','4')
+    assert 'were cut off' in output
+    assert "tasks weren't finished within the --budget, collect only them again" in output
+    assert 'tasks failed' not in output
+    failuresName = [name for name in os.listdir(tmp_path) if name.endswith('.failed.json')][0]
+    with open(tmp_path/failuresName) as failuresFile:
+        assert json.load(failuresFile)['tasks']
+
+def test_fanOutKeepsEveryTargetsPorts(tmp_path):
+    #the targets of a fan-out cache their ports at the same time without dropping each other's
+    writeCluster(tmp_path)
+    runLogCollect(tmp_path,'-n','fed-amf','--context','east,west','-p','amf-cc','--port-cache-ttl','600')
+    for context in ('east','west'):
+        with open(tmp_path/'.logCollect'/'ports'/f'{context}_fed-amf.json') as cacheFile:
+            assert json.load(cacheFile)['amf-cc']['port']=='8080'